@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Measure how long a freshly started ``rossock_client.py`` takes to start and to get its first message.
+
+Starts ``fake_rosbridge.py`` with a small ``/tf`` topic on ``--port`` (the
+client connects to 9090), then runs the client in a new interpreter ``--runs``
+times, as a restarted process on a robot would. A ROS master must be running
+for the client node. Each run reports the time spent importing the client and
+creating its node and connector, the time until its first ``/tf`` callback,
+and the wall time of the whole process including the interpreter start up.
+"""
+
+import argparse
+import imp
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+CLIENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rossock_client.py')
+
+
+def run_child(modules):
+    started = time.time()
+
+    sys.dont_write_bytecode = True
+    client = imp.load_source('rossock_client', CLIENT)
+    app = client.Main()
+
+    from twisted.internet import reactor
+
+    result = {'startup': time.time() - started, 'first_message': None,
+              'modules': sorted(name for name in modules if name in sys.modules)}
+
+    tf_cb = app.tf_cb
+
+    def first_tf_cb(message):
+        if result['first_message'] is None:
+            result['first_message'] = time.time() - started
+            reactor.stop()
+        tf_cb(message)
+
+    app.tf_cb = first_tf_cb
+    app.run_subscriber_example()
+    reactor.callLater(10.0, reactor.stop)
+    app._ros_client.run_forever()
+
+    print(json.dumps(result))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=9090,
+                        help='Port of the fake bridge, the client connects to 9090.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--check-modules', default='numpy,websocket,cPickle,rossock.comms.decode_pipeline',
+                        help='Comma separated modules reported if the client loaded them.')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    modules = args.check_modules.split(',')
+    if args.child:
+        run_child(modules)
+        sys.exit(0)
+
+    bridge = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_rosbridge.py'),
+        '--port', str(args.port),
+        '--topic', '/tf:16:200'])
+
+    results = []
+    try:
+        time.sleep(2.0)
+        for _ in range(args.runs):
+            spawned = time.time()
+            output = subprocess.check_output([
+                sys.executable, '-W', 'ignore', os.path.abspath(__file__), '--child',
+                '--check-modules', args.check_modules])
+            result = json.loads(output.decode('utf8').strip().splitlines()[-1])
+            result['process'] = time.time() - spawned
+            results.append(result)
+    finally:
+        bridge.terminate()
+
+    for stage in ('startup', 'first_message', 'process'):
+        values = [result[stage] for result in results if result[stage] is not None]
+        if values:
+            print('%-14s p50=%.1fms max=%.1fms' % (stage, 1000 * percentile(values, 0.5), 1000 * max(values)))
+
+    print('missed first message: %d/%d' % (sum(result['first_message'] is None for result in results), len(results)))
+    print('optional modules loaded: %s' % (', '.join(results[-1]['modules']) or 'none'))
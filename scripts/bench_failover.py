@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Measure the data gap when the active bridge fails and the client fails over.
+
+Starts a primary and a standby ``fake_rosbridge.py`` streaming ``/tf``,
+connects to both as an ordered endpoint list, and then takes the primary
+down, either by killing it (``--mode kill``) or by freezing it so that its
+connection stays open but silent (``--mode stop``, only detected by the pings).
+Reports the gap between the last message before the failure and the first one
+after it, along with the outages recorded by the connector.
+
+With ``--check``, no bridge is started: the reconnection plan of the failover
+policy is checked against the expected endpoints and delays instead.
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from twisted.internet import reactor
+
+from rossock.comms.failover import EndpointFailover
+from rossock.managers.rossock_core import Topic
+from rossock.managers.rosbridge_connector import RosBridgeConnector
+
+
+def start_bridge(port):
+    return subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_rosbridge.py'),
+        '--port', str(port), '--topic', '/tf:16:100'])
+
+
+def check():
+    failover = EndpointFailover(['a', 'b', 'c'], initial_delay=0.1, factor=2.0, max_delay=1.0, jitter=0.0)
+    failover.connected()
+    expected = [
+        (True, 'b', 0.0),   # Connection to the primary lost, the standby is tried right away
+        (False, 'c', 0.0),  # Every endpoint is tried once before backing off
+        (False, 'a', 0.0),
+        (False, 'b', 0.2),  # Each endpoint failed once in this round
+        (False, 'c', 0.0),
+        (False, 'a', 0.0),
+        (False, 'b', 0.4),
+        (False, 'c', 0.0),
+        (False, 'a', 0.0),
+        (False, 'b', 0.8),
+        (False, 'c', 0.0),
+        (False, 'a', 0.0),
+        (False, 'b', 1.0),  # Capped by max_delay
+    ]
+    plan = [failover.next_attempt(was_connected) for was_connected, _, _ in expected]
+    failover.connected()
+    plan.append(failover.next_attempt(True))
+    expected.append((True, 'c', 0.0))  # Connected to the standby, it fails over again right away
+
+    single = EndpointFailover(['a'], initial_delay=0.1, factor=2.0, max_delay=1.0, jitter=0.0)
+    single.connected()
+    plan.extend(single.next_attempt(was_connected) for was_connected in (True, False, False))
+    expected.extend([(True, 'a', 0.1), (False, 'a', 0.2), (False, 'a', 0.4)])
+
+    failed = 0
+    for (was_connected, url, delay), (planned_url, planned_delay) in zip(expected, plan):
+        ok = planned_url == url and abs(planned_delay - delay) < 1e-9
+        failed += not ok
+        print('%-4s %s -> %s after %.1fs%s' % ('ok' if ok else 'FAIL', 'lost' if was_connected else 'failed',
+                                                planned_url, planned_delay,
+                                                '' if ok else ', expected %s after %.1fs' % (url, delay)))
+    return failed == 0
+
+
+def run(args):
+    primary = start_bridge(args.port)
+    standby = start_bridge(args.port + 1)
+    received = []
+
+    try:
+        time.sleep(2.0)
+        ros_client = RosBridgeConnector(['ws://127.0.0.1:%d' % args.port, 'ws://127.0.0.1:%d' % (args.port + 1)],
+                                        ping_interval=args.ping_interval, ping_timeout=args.ping_timeout)
+        topic = Topic(ros_client, '/tf', 'tf2_msgs/TFMessage')
+        topic.subscribe(lambda message: received.append(time.time()))
+
+        failed_at = []
+
+        def fail_primary():
+            failed_at.append(time.time())
+            if args.mode == 'kill':
+                primary.kill()
+            else:
+                primary.send_signal(signal.SIGSTOP)
+
+        reactor.callLater(args.warmup, fail_primary)
+        reactor.callLater(args.warmup + args.duration, reactor.stop)
+        ros_client.run_forever()
+    finally:
+        if args.mode == 'stop':
+            primary.send_signal(signal.SIGCONT)
+        primary.terminate()
+        standby.terminate()
+
+    before = [stamp for stamp in received if stamp < failed_at[0]]
+    after = [stamp for stamp in received if stamp >= failed_at[0]]
+    stats = ros_client.stats()['reconnect']
+
+    print('mode=%s ping=%.1f/%.1fs messages=%d/%d gap=%s' % (
+        args.mode, args.ping_interval, args.ping_timeout, len(before), len(after),
+        '%.3fs' % (after[0] - before[-1]) if before and after else 'never recovered'))
+    print('endpoint=%s attempts=%d failovers=%d connects=%d' % (
+        stats['endpoint'], stats['attempts'], stats['failovers'], stats['connects']))
+    for outage in stats['outages']:
+        print('outage on %s: detected after %.3fs, connected after %.3fs, first message after %.3fs' % (
+            outage['endpoint'], outage['started'] - failed_at[0],
+            outage['started'] - failed_at[0] + outage['time_to_connect'],
+            outage['started'] - failed_at[0] + outage['time_to_first_message']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=9192)
+    parser.add_argument('--mode', choices=('kill', 'stop'), default='kill')
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--duration', type=float, default=8.0,
+                        help='Seconds to keep running after the primary fails.')
+    parser.add_argument('--ping-interval', type=float, default=2.0)
+    parser.add_argument('--ping-timeout', type=float, default=2.0)
+    parser.add_argument('--check', action='store_true', help='Only check the reconnection plan.')
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check() else 1)
+    run(args)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Measure head-of-line latency of a small topic while a bulk topic is streamed.
+
+Starts ``fake_rosbridge.py`` with a small ``/tf`` topic and a large
+``/velodyne_points`` topic, then reports the delay between the bridge stamping
+each ``/tf`` message and its callback running on the client, with the
+dispatch options given on the command line.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from twisted.internet import reactor
+
+from rossock.managers.rossock_core import Topic
+from rossock.managers.rosbridge_connector import RosBridgeConnector
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_client(port, duration, decode_threshold, priority, cloud_work, trace, clock_offset):
+    latencies = []
+    ros_client = RosBridgeConnector('127.0.0.1', port, decode_threshold=decode_threshold)
+    if trace:
+        ros_client.enable_latency_tracing(sample_every=trace)
+
+    def tf_cb(message):
+        stamp = message['header']['stamp']
+        latencies.append(time.time() + clock_offset - stamp['secs'] - stamp['nsecs'] / 1e9)
+
+    def velodyne_cb(message):
+        # Stand-in for converting and republishing the cloud
+        time.sleep(cloud_work)
+
+    Topic(ros_client, '/tf', 'tf2_msgs/TFMessage',
+          priority='high' if priority else None).subscribe(tf_cb)
+    Topic(ros_client, '/velodyne_points', 'sensor_msgs/PointCloud2',
+          priority='bulk' if priority else None).subscribe(velodyne_cb)
+
+    reactor.callLater(duration, reactor.stop)
+    ros_client.run_forever()
+
+    if trace:
+        print_trace(ros_client.latency_stats())
+
+    # Skip the warm-up while the connection is being established
+    return latencies[len(latencies) // 10:]
+
+
+def print_trace(stats):
+    print('clock offset %.3fs (+/- %.3fs)' % (stats['clock_offset'], stats['clock_offset_error'] or 0))
+    for topic, stages in sorted(stats['topics'].items()):
+        print('%s (%d traced)' % (topic, stages['samples']))
+        for stage in ('network', 'decode', 'queue', 'callback', 'total'):
+            if stage in stages:
+                print('  %-8s p50=%.1fms p99=%.1fms' % (
+                    stage, 1000 * stages[stage][50], 1000 * stages[stage][99]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=9190)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--cloud-size', type=int, default=4000000)
+    parser.add_argument('--decode-threshold', type=int, default=None,
+                        help='Use the decode pipeline for frames of at least this many bytes.')
+    parser.add_argument('--priority', action='store_true',
+                        help='Dispatch /tf on the high priority lane and the cloud on the bulk lane.')
+    parser.add_argument('--cloud-work', type=float, default=0.0,
+                        help='Seconds spent in each cloud callback.')
+    parser.add_argument('--trace', type=int, default=0, metavar='N',
+                        help='Trace one frame out of N and print the per-stage latencies.')
+    parser.add_argument('--clock-offset', type=float, default=0.0,
+                        help='Offset of the bridge clock, to check it is estimated and corrected.')
+    args = parser.parse_args()
+
+    bridge = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_rosbridge.py'),
+        '--port', str(args.port),
+        '--clock-offset', str(args.clock_offset),
+        '--topic', '/tf:16:200',
+        '--topic', '/velodyne_points:%d:10' % args.cloud_size])
+
+    try:
+        time.sleep(2.0)
+        latencies = run_client(args.port, args.duration, args.decode_threshold, args.priority, args.cloud_work,
+                               args.trace, args.clock_offset)
+    finally:
+        bridge.terminate()
+
+    print('decode_threshold=%s priority=%s samples=%d p50=%.1fms p99=%.1fms max=%.1fms' % (
+        args.decode_threshold, args.priority, len(latencies), 1000 * percentile(latencies, 0.5),
+        1000 * percentile(latencies, 0.99), 1000 * max(latencies)))
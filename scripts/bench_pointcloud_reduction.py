@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Measure the throughput of the point cloud reduction stages.
+
+Builds synthetic Velodyne-like clouds (x, y, z, intensity, ring with a
+32 byte point step) as they arrive from the bridge, and times decoding,
+each stage and the complete reduction at typical cloud sizes.
+"""
+
+import argparse
+import base64
+import time
+
+import numpy
+
+from rossock.functions.pointcloud import (FieldProjection, PointCloudReducer, RangeCrop, ROICrop,
+                                          VoxelGrid, cloud_to_array)
+
+
+def make_cloud(size):
+    dtype = numpy.dtype({'names': ['x', 'y', 'z', 'intensity', 'ring'],
+                         'formats': ['<f4', '<f4', '<f4', '<f4', '<u2'],
+                         'offsets': [0, 4, 8, 16, 20], 'itemsize': 32})
+    points = numpy.zeros(size, dtype=dtype)
+
+    distance = numpy.random.uniform(0.5, 100.0, size)
+    azimuth = numpy.random.uniform(-numpy.pi, numpy.pi, size)
+    elevation = numpy.radians(numpy.random.uniform(-15.0, 15.0, size))
+    points['x'] = distance * numpy.cos(elevation) * numpy.cos(azimuth)
+    points['y'] = distance * numpy.cos(elevation) * numpy.sin(azimuth)
+    points['z'] = distance * numpy.sin(elevation)
+    points['intensity'] = numpy.random.uniform(0.0, 255.0, size)
+    points['ring'] = numpy.random.randint(0, 16, size)
+
+    return {
+        'header': {'seq': 0, 'stamp': {'secs': 0, 'nsecs': 0}, 'frame_id': 'velodyne'},
+        'height': 1, 'width': size, 'is_bigendian': False, 'is_dense': True,
+        'point_step': 32, 'row_step': 32 * size,
+        'fields': [{'name': name, 'offset': offset, 'datatype': datatype, 'count': 1}
+                   for name, offset, datatype in (('x', 0, 7), ('y', 4, 7), ('z', 8, 7),
+                                                  ('intensity', 16, 7), ('ring', 20, 4))],
+        'data': base64.b64encode(points.tobytes()).decode('ascii'),
+    }
+
+
+def timed(function, argument, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        result = function(argument)
+
+    return (time.time() - start) / repeat, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[30000, 120000, 300000])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--leaf-size', type=float, default=0.2)
+    args = parser.parse_args()
+
+    stages = [
+        ('range', RangeCrop(1.0, 50.0)),
+        ('roi', ROICrop((-30.0, -30.0, -2.0), (30.0, 30.0, 3.0))),
+        ('voxel', VoxelGrid(args.leaf_size)),
+        ('project', FieldProjection(['x', 'y', 'z', 'intensity'])),
+    ]
+    reducer = PointCloudReducer([stage for _, stage in stages])
+
+    for size in args.sizes:
+        cloud = make_cloud(size)
+        decode_time, points = timed(cloud_to_array, cloud, args.repeat)
+
+        line = ['points=%d' % size, 'decode=%.1fms' % (1000 * decode_time)]
+        for name, stage in stages:
+            stage_time, _ = timed(stage, points, args.repeat)
+            line.append('%s=%.1fms' % (name, 1000 * stage_time))
+
+        total_time, reduced = timed(reducer, cloud, args.repeat)
+        line.append('total=%.1fms (%.1fM points/s) kept=%d bytes=%d->%d' % (
+            1000 * total_time, size / total_time / 1e6, reduced['width'], len(cloud['data']), len(reduced['data'])))
+
+        print(' '.join(line))
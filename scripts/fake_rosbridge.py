@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Minimal stand-in for a rosbridge server, used by the benchmark scripts.
+
+Streams synthetic messages on the configured topics to every client that
+subscribes to them, and lists them through the ``/rosapi/topics`` service.
+Header stamps and ``/rosapi/get_time`` can be given a clock offset.
+
+Each topic is given as ``name:size:hz`` where ``size`` is the number of
+bytes in the ``data`` field, which is base64 encoded like the bridge does
+for ``uint8[]`` arrays.
+"""
+
+import argparse
+import base64
+import json
+import os
+import time
+
+from autobahn.twisted.websocket import WebSocketServerFactory, WebSocketServerProtocol
+from twisted.internet import reactor, task
+
+
+class FakeRosBridgeProtocol(WebSocketServerProtocol):
+
+    def onOpen(self):
+        self._loops = {}
+
+    def onMessage(self, payload, isBinary):
+        message = json.loads(payload.decode('utf8'))
+        topic = message.get('topic')
+
+        if message['op'] == 'subscribe' and topic in self.factory.topics and topic not in self._loops:
+            loop = task.LoopingCall(self._publish, topic)
+            loop.start(1.0 / self.factory.topics[topic][1], now=False)
+            self._loops[topic] = loop
+        elif message['op'] == 'unsubscribe' and topic in self._loops:
+            self._loops.pop(topic).stop()
+        elif message['op'] == 'call_service':
+            self._call_service(message)
+
+    def _call_service(self, message):
+        response = {'op': 'service_response', 'id': message.get('id'), 'service': message['service']}
+
+        if message['service'] == '/rosapi/topics':
+            topics = sorted(self.factory.topics)
+            response.update(result=True, values={'topics': topics, 'types': [self.factory.TYPE] * len(topics)})
+        elif message['service'] == '/rosapi/get_time':
+            now = self.factory.now()
+            response.update(result=True, values={'time': {'secs': int(now), 'nsecs': int((now % 1) * 1e9)}})
+        else:
+            response.update(result=False, values='Service %s does not exist' % message['service'])
+
+        self.sendMessage(json.dumps(response).encode('utf8'), isBinary=False)
+
+    def onClose(self, wasClean, code, reason):
+        for loop in getattr(self, '_loops', {}).values():
+            loop.stop()
+        self._loops = {}
+
+    def _publish(self, topic):
+        now = self.factory.now()
+        stamp = '{"secs": %d, "nsecs": %d}' % (int(now), int((now % 1) * 1e9))
+        prefix, suffix = self.factory.frames[topic]
+        self.sendMessage(prefix + stamp.encode('utf8') + suffix, isBinary=False)
+
+
+class FakeRosBridgeFactory(WebSocketServerFactory):
+    protocol = FakeRosBridgeProtocol
+
+    # Type reported by /rosapi/topics for every topic
+    TYPE = 'std_msgs/UInt8MultiArray'
+
+    def __init__(self, url, topics, clock_offset=0.0):
+        WebSocketServerFactory.__init__(self, url)
+        self.topics = topics
+        self.clock_offset = clock_offset
+        self.frames = {}
+
+        for name, (size, _) in topics.items():
+            data = json.dumps(base64.b64encode(os.urandom(size)).decode('ascii'))
+            frame = '{"op": "publish", "topic": "%s", "msg": {"data": %s, "header": {"frame_id": "", "stamp": ' % (
+                name, data)
+            self.frames[name] = (frame.encode('utf8'), b'}}}')
+
+    def now(self):
+        """Time of the bridge clock, which is off by ``clock_offset`` seconds."""
+        return time.time() + self.clock_offset
+
+
+def parse_topic(value):
+    name, size, hz = value.split(':')
+    return name, (int(size), float(hz))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=9090)
+    parser.add_argument('--topic', type=parse_topic, action='append', default=[])
+    parser.add_argument('--clock-offset', type=float, default=0.0,
+                        help='Seconds the bridge clock (stamps and /rosapi/get_time) is ahead of the host.')
+    args = parser.parse_args()
+
+    factory = FakeRosBridgeFactory(u'ws://127.0.0.1:%d' % args.port, dict(args.topic), args.clock_offset)
+    reactor.listenTCP(args.port, factory)
+    reactor.run()
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 
+import threading
+
 import rospy
 
 from twisted.internet import reactor
@@ -22,15 +24,41 @@ class Main():
         self._velodyne_pub = rospy.Publisher('/velodyne_points', PointCloud2, queue_size=100)
         self._tf_pub = rospy.Publisher('/tf', TFMessage, queue_size=10)
 
+        self._tf_buffer = None
+        self._tf_buffer_lock = threading.Lock()
+
         self.init_ros_node()
+        self._republish_tf = rospy.get_param('~republish_tf', True)
+        self._cloud_reducer = self.init_cloud_reducer()
 
     def velodyne_cb(self, data):
+        if self._cloud_reducer:
+            data = self._cloud_reducer(data)
+
         result = message_converter.convert_dictionary_to_ros_message('sensor_msgs/PointCloud2', data)
         self._velodyne_pub.publish(result)
 
+    @property
+    def tf_buffer(self):
+        """Transforms received from the bridge, co-located consumers can query
+        it directly with tf_buffer.lookup() instead of listening to /tf.
+        Created on first use, so numpy is not loaded before transforms arrive.
+        """
+        with self._tf_buffer_lock:
+            if self._tf_buffer is None:
+                from rossock.functions.tf_buffer import TFBuffer
+                self._tf_buffer = TFBuffer()
+            return self._tf_buffer
+
     def tf_cb(self, data):
-        result = message_converter.convert_dictionary_to_ros_message('tf2_msgs/TFMessage', data)
-        self._tf_pub.publish(result)
+        if self._republish_tf:
+            result = message_converter.convert_dictionary_to_ros_message('tf2_msgs/TFMessage', data)
+            self._tf_pub.publish(result)
+
+        self.tf_buffer.feed(data)
+
+    def tf_static_cb(self, data):
+        self.tf_buffer.feed(data, static=True)
 
     def run_subscriber_example(self):
         velodyne_sub = Topic(self._ros_client, '/velodyne_points', 'sensor_msgs/PointCloud2')
@@ -39,9 +67,42 @@ class Main():
         tf_sub = Topic(self._ros_client, '/tf', 'tf2_msgs/TFMessage')
         tf_sub.subscribe(self.tf_cb)
 
+        tf_static_sub = Topic(self._ros_client, '/tf_static', 'tf2_msgs/TFMessage')
+        tf_static_sub.subscribe(self.tf_static_cb)
+
     def init_ros_node(self):
         rospy.init_node("velodyne_points_republisher", anonymous=True);
 
+    def init_cloud_reducer(self):
+        """Build the reduction stages applied to clouds before they are republished.
+        Every stage is disabled unless its parameter is set, e.g. ``_voxel_leaf_size:=0.1``.
+        The reduction (and numpy) is only loaded when at least one stage is enabled.
+        """
+        min_range = rospy.get_param('~cloud_min_range', 0.0)
+        max_range = rospy.get_param('~cloud_max_range', 0.0)
+        roi = rospy.get_param('~cloud_roi', None)
+        leaf_size = rospy.get_param('~voxel_leaf_size', 0.0)
+        fields = rospy.get_param('~cloud_fields', None)
+        if not (min_range or max_range or roi or leaf_size or fields):
+            return None
+
+        from rossock.functions.pointcloud import PointCloudReducer, RangeCrop, ROICrop, VoxelGrid, FieldProjection
+
+        stages = []
+        if min_range or max_range:
+            stages.append(RangeCrop(min_range, max_range or float('inf')))
+
+        if roi:
+            stages.append(ROICrop(roi[:3], roi[3:], rospy.get_param('~cloud_roi_invert', False)))
+
+        if leaf_size:
+            stages.append(VoxelGrid(leaf_size))
+
+        if fields:
+            stages.append(FieldProjection(fields))
+
+        return PointCloudReducer(stages)
+
 if __name__ == "__main__":
 
     app = Main()
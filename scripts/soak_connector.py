@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+"""
+Soak the connector lifecycle and fail when retained memory keeps growing.
+
+Starts ``fake_rosbridge.py`` with a few streaming topics, then churns the
+client as fast as the reactor allows: every cycle subscribes and unsubscribes
+a batch of topics (half of them with names never used before), publishes a few
+messages, and every ``--reconnect-every`` cycles closes the connection and
+reconnects. After a warm-up, memory retained per subsystem is sampled with
+``tracemalloc``, or where it is not available (e.g. Python 2) by sizing the
+live objects found by ``gc`` along with the containers they hold. The run fails
+if a subsystem retains more than ``--max-growth`` bytes between the end of the warm-up
+and the end of the run, or if the connector keeps more events or pending
+``ready`` callbacks than it started with.
+"""
+
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import time
+
+from collections import defaultdict, deque
+
+from twisted.internet import reactor
+
+from rossock.managers.rossock_core import Message, Topic
+from rossock.managers.rosbridge_connector import RosBridgeConnector
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+STREAMED_TOPICS = ('/tf', '/chatter', '/scan')
+
+
+def subsystem(filename):
+    """Name the subsystem a source file belongs to."""
+    path = filename.replace(os.sep, '/')
+    if '/rossock/' in path:
+        return 'rossock.' + os.path.splitext(path.rsplit('/rossock/', 1)[1])[0].replace('/', '.')
+    for package in ('twisted', 'autobahn', 'txaio'):
+        if '/%s/' % package in path:
+            return package
+
+    return 'other'
+
+
+def sample_memory():
+    """Retained memory per subsystem, in bytes."""
+    gc.collect()
+    usage = defaultdict(int)
+
+    if tracemalloc:
+        for stat in tracemalloc.take_snapshot().statistics('filename'):
+            usage[subsystem(stat.traceback[0].filename)] += stat.size
+    else:
+        for obj in gc.get_objects():
+            module = getattr(type(obj), '__module__', None)
+            if not isinstance(module, str):
+                module = ''
+            name = module.split('.')[0]
+            size = sys.getsizeof(obj)
+
+            # Containers held by our objects are where per-topic state piles up
+            if name == 'rossock':
+                for value in getattr(obj, '__dict__', {}).values():
+                    if isinstance(value, (dict, list, set, deque)):
+                        size += sys.getsizeof(value)
+            else:
+                name = name if name in ('twisted', 'autobahn', 'txaio') else 'other'
+
+            usage[module if name == 'rossock' else name] += size
+
+    return usage
+
+
+def connector_counts(ros_client):
+    stats = ros_client.stats()
+    return {
+        'events': stats['events'],
+        'ready_callbacks': stats['ready_callbacks'],
+        'buffered_bytes': stats['bytes'],
+        'outbound_messages': stats['outbound_messages'],
+    }
+
+
+class Soak(object):
+
+    def __init__(self, ros_client, args):
+        self.ros_client = ros_client
+        self.args = args
+        self.cycles = 0
+        self.reconnects = 0
+        self.received = 0
+        self.baseline = None
+        self.baseline_counts = None
+        self.samples = []
+
+        self._publisher = Topic(ros_client, '/soak/out', 'std_msgs/String')
+        self._subscribed = []
+        self._next_name = 0
+
+    def start(self):
+        self._warmup_end = time.time() + self.args.warmup
+        self._end = self._warmup_end + self.args.duration
+        self._next_sample = self._warmup_end + self.args.sample_interval
+        self.ros_client.on_ready(lambda: reactor.callLater(0, self._cycle), run_in_thread=False)
+
+    def _cycle(self):
+        try:
+            self._step()
+        except Exception:
+            reactor.stop()
+            raise
+
+    def _step(self):
+        now = time.time()
+
+        if self.baseline is None and now >= self._warmup_end:
+            self.baseline = sample_memory()
+            self.baseline_counts = connector_counts(self.ros_client)
+
+        if self.baseline is not None and now >= self._next_sample:
+            self._next_sample = now + self.args.sample_interval
+            self.samples.append((now - self._warmup_end, sample_memory(), connector_counts(self.ros_client)))
+
+        if now >= self._end:
+            reactor.stop()
+            return
+
+        self._churn_subscriptions()
+        self.cycles += 1
+
+        if self.cycles % self.args.reconnect_every == 0:
+            self._reconnect()
+        else:
+            reactor.callLater(0, self._cycle)
+
+    def _churn_subscriptions(self):
+        # Topics stay subscribed for one cycle so that streamed ones receive messages
+        for topic in self._subscribed:
+            topic.unsubscribe()
+
+        topics = self._subscribed = []
+        for index in range(self.args.subscriptions):
+            if index % 2:
+                name = STREAMED_TOPICS[index % len(STREAMED_TOPICS)]
+            else:
+                self._next_name += 1
+                name = '/soak/churn_%d' % self._next_name
+
+            topic = Topic(self.ros_client, name, 'std_msgs/String', priority='normal')
+            topic.subscribe(self._received)
+            topics.append(topic)
+
+        for index in range(self.args.publishes):
+            self._publisher.publish(Message({'data': 'soak %d' % index}))
+
+    def _received(self, message):
+        self.received += 1
+
+    def _reconnect(self):
+        self.reconnects += 1
+
+        def _closed(proto):
+            self.ros_client.factory.off('close', _closed)
+            self.ros_client.connect()
+            self.ros_client.on_ready(lambda: reactor.callLater(0, self._cycle), run_in_thread=False)
+
+        self.ros_client.factory.on('close', _closed)
+        self.ros_client.close()
+
+
+def report(soak, max_growth):
+    print('cycles=%d reconnects=%d received=%d samples=%d' % (
+        soak.cycles, soak.reconnects, soak.received, len(soak.samples)))
+
+    if soak.baseline is None or not soak.samples:
+        print('FAIL: the run ended before the warm-up, increase --duration')
+        return False
+
+    final = soak.samples[-1][1]
+    growth = dict((name, final.get(name, 0) - soak.baseline.get(name, 0))
+                  for name in set(final).union(soak.baseline))
+
+    print('%-40s %12s %12s %12s' % ('subsystem', 'baseline', 'final', 'growth'))
+    for name in sorted(growth, key=lambda name: -growth[name]):
+        print('%-40s %12d %12d %12d' % (name, soak.baseline.get(name, 0), final.get(name, 0), growth[name]))
+
+    ok = True
+    for name, value in sorted(growth.items()):
+        if name.startswith('rossock') and value > max_growth:
+            print('FAIL: %s retained %d more bytes' % (name, value))
+            ok = False
+
+    counts = soak.samples[-1][2]
+    print('connector baseline=%s final=%s' % (soak.baseline_counts, counts))
+    for name in ('events', 'ready_callbacks'):
+        if counts[name] > soak.baseline_counts[name]:
+            print('FAIL: connector %s grew from %d to %d' % (name, soak.baseline_counts[name], counts[name]))
+            ok = False
+
+    print('PASS' if ok else 'FAIL')
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=9191)
+    parser.add_argument('--warmup', type=float, default=5.0)
+    parser.add_argument('--duration', type=float, default=60.0,
+                        help='Seconds of churn after the warm-up.')
+    parser.add_argument('--sample-interval', type=float, default=5.0)
+    parser.add_argument('--subscriptions', type=int, default=20,
+                        help='Topics subscribed and unsubscribed per cycle.')
+    parser.add_argument('--publishes', type=int, default=5,
+                        help='Messages published per cycle.')
+    parser.add_argument('--reconnect-every', type=int, default=50,
+                        help='Close and reconnect the connection every this many cycles.')
+    parser.add_argument('--max-growth', type=int, default=256 * 1024,
+                        help='Bytes a subsystem may retain after the warm-up.')
+    args = parser.parse_args()
+
+    bridge = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_rosbridge.py'),
+        '--port', str(args.port),
+        '--topic', '/tf:16:100',
+        '--topic', '/chatter:64:50',
+        '--topic', '/scan:8000:20'])
+
+    try:
+        time.sleep(2.0)
+        if tracemalloc:
+            tracemalloc.start()
+
+        ros_client = RosBridgeConnector('127.0.0.1', args.port)
+        soak = Soak(ros_client, args)
+        soak.start()
+        ros_client.run_forever()
+    finally:
+        bridge.terminate()
+
+    sys.exit(0 if report(soak, args.max_growth) else 1)
@@ -0,0 +1,220 @@
+import os
+import re
+import sys
+
+from collections import deque
+
+from twisted.internet import reactor
+from twisted.internet.protocol import ProcessProtocol
+
+from rossock.comms.decode_worker import HEADER, pickle
+from rossock.comms.protocol import decode_message
+from rossock.managers.rossock_core import Message
+from rossock.misc.logger import get_logger
+
+logger = get_logger('decode')
+
+_TOPIC_PATTERN = re.compile(br'"topic"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+class DecodeWorkerProtocol(ProcessProtocol):
+    """Feed frames to a decode worker process and collect its results in order."""
+
+    def __init__(self, on_result):
+        self.pending = deque()
+        self.ended = False
+        self._on_result = on_result
+        self._chunks = []
+        self._buffered = 0
+        self._expected = None
+
+    def decode(self, payload, topic, entry):
+        self.pending.append((topic, entry))
+        self.transport.write(HEADER.pack(len(payload)))
+        self.transport.write(payload)
+
+    def outReceived(self, data):
+        self._chunks.append(data)
+        self._buffered += len(data)
+
+        while True:
+            if self._expected is None:
+                if self._buffered < HEADER.size:
+                    return
+                self._expected = HEADER.unpack(self._take(HEADER.size))[0]
+
+            if self._buffered < self._expected:
+                return
+
+            message, error = pickle.loads(self._take(self._expected))
+            self._expected = None
+
+            topic, entry = self.pending.popleft()
+            self._on_result(topic, entry, message, error)
+
+    def errReceived(self, data):
+        logger.error('Worker: %s', data.decode('utf8', 'replace').strip())
+
+    def processEnded(self, reason):
+        self.ended = True
+
+        # Anything still in flight is lost, release it so the topic lanes do not stall
+        while self.pending:
+            topic, entry = self.pending.popleft()
+            self._on_result(topic, entry, None, 'decode worker exited')
+
+    def _take(self, size):
+        data = b''.join(self._chunks)
+        self._chunks = [data[size:]]
+        self._buffered -= size
+        return data[:size]
+
+
+class DecodePipeline(object):
+    """Decode large ROS Bridge frames in worker processes instead of the reactor thread.
+    Frames shorter than ``threshold`` bytes are decoded inline, so small latency
+    critical topics keep the fast path while a large frame is still being parsed.
+    The JSON decoder holds the interpreter lock for the whole frame, so the workers
+    are separate processes driven by the reactor; decoded messages come back pickled,
+    which for the large ``data`` strings sent by the bridge costs little more than a copy.
+    Decoded messages are re-sequenced per topic: a message is only dispatched once
+    every earlier frame of the same topic has been dispatched. The topic of a large
+    frame is located before decoding by scanning the head and tail of the frame;
+    frames where it cannot be found are decoded inline to keep their ordering.
+    Dispatching always happens on the reactor thread.
+    Frames waiting to be decoded or re-sequenced are accounted in the ``decode`` buffer
+    of the memory budget. They cannot be evicted, new frames are dropped instead.
+    Args:
+        threshold (:obj:`int`): Size (in bytes) from which frames are decoded by the workers.
+        workers (:obj:`int`): Number of decoding processes.
+        peek_size (:obj:`int`): Number of bytes scanned at each end of a frame to find its topic.
+        budget (:class:`.MemoryBudget`): Memory budget of the client, or `None`.
+    """
+
+    BUFFER = 'decode'
+
+    def __init__(self, threshold=256 * 1024, workers=2, peek_size=512, budget=None):
+        self.threshold = threshold
+        self.workers = workers
+        self.peek_size = peek_size
+
+        self._budget = budget
+        if budget:
+            budget.register(self.BUFFER)
+
+        self._workers = []
+        self._lanes = {}
+        self._shutdown_registered = False
+
+    @property
+    def pending(self):
+        """Number of frames waiting to be decoded or re-sequenced."""
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def queued(self, topic):
+        """Number of frames of a topic waiting to be decoded or re-sequenced."""
+        return len(self._lanes.get(topic, ()))
+
+    def start(self):
+        """Spawn the worker processes, replacing any that exited."""
+        self._workers = [worker for worker in self._workers if not worker.ended]
+
+        while len(self._workers) < self.workers:
+            worker = DecodeWorkerProtocol(self._decoded)
+            reactor.spawnProcess(worker, sys.executable,
+                                 [sys.executable, '-m', 'rossock.comms.decode_worker'],
+                                 env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+            self._workers.append(worker)
+
+        if not self._shutdown_registered:
+            self._shutdown_registered = True
+            reactor.addSystemEventTrigger('during', 'shutdown', self.stop)
+
+    def stop(self):
+        """Stop the worker processes once they have finished the frames sent to them."""
+        for worker in self._workers:
+            if not worker.ended:
+                worker.transport.closeStdin()
+
+        self._workers = []
+
+    def feed(self, payload, dispatch):
+        """Decode a frame and hand it to ``dispatch`` respecting per-topic ordering.
+        Must be called from the reactor thread.
+        Args:
+            payload (:obj:`bytes`): Raw frame as received from the transport.
+            dispatch (:obj:`callable`): Called with the decoded :class:`.Message`.
+        """
+        topic = None
+        if len(payload) >= self.threshold:
+            topic = self.peek_topic(payload)
+
+        if topic is None:
+            message = decode_message(payload)
+            lane = self._lanes.get(message.get('topic'))
+            if not lane:
+                dispatch(message)
+            elif self._reserve(message['topic'], message.size):
+                lane.append([message, dispatch, True, message.size])
+            return
+
+        if not self._reserve(topic, len(payload)):
+            return
+
+        if not self._workers or any(worker.ended for worker in self._workers):
+            self.start()
+
+        entry = [None, dispatch, False, len(payload)]
+        self._lanes.setdefault(topic, deque()).append(entry)
+
+        worker = min(self._workers, key=lambda worker: len(worker.pending))
+        worker.decode(payload, topic, entry)
+
+    def peek_topic(self, payload):
+        """Locate the topic name of a frame without decoding it.
+        Args:
+            payload (:obj:`bytes`): Raw frame as received from the transport.
+        Returns:
+            str: Topic name, or ``None`` if it cannot be found near either end of the frame.
+        """
+        match = _TOPIC_PATTERN.search(payload, 0, self.peek_size)
+        if not match:
+            match = _TOPIC_PATTERN.search(payload, max(0, len(payload) - self.peek_size))
+
+        if not match:
+            return None
+
+        return match.group(1).decode('utf8')
+
+    def _reserve(self, topic, size):
+        return not self._budget or self._budget.reserve(self.BUFFER, topic, size)
+
+    def _decoded(self, topic, entry, values, error):
+        if error is not None:
+            logger.error('Failed to decode frame on %s: %s', topic, error)
+        else:
+            entry[0] = Message(values)
+            entry[0].size = entry[3]
+
+        entry[2] = True
+        self._drain(topic)
+
+    def _drain(self, topic):
+        lane = self._lanes.get(topic)
+        if lane is None:
+            return
+
+        while lane and lane[0][2]:
+            message, dispatch, _, size = lane.popleft()
+            if self._budget:
+                self._budget.release(self.BUFFER, topic, size)
+            if message is None:
+                continue
+
+            try:
+                dispatch(message)
+            except Exception as exception:
+                logger.exception('Failed to dispatch message on %s: %s', topic, exception)
+
+        if not lane:
+            del self._lanes[topic]
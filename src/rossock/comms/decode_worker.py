@@ -0,0 +1,55 @@
+"""
+Worker process of the :class:`.DecodePipeline`.
+
+Reads length-prefixed JSON frames on stdin and writes back, for each of
+them and in the same order, a length-prefixed pickle of ``(message, error)``.
+Kept free of Twisted imports so that workers start quickly.
+"""
+
+import json
+import struct
+import sys
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+HEADER = struct.Struct('>I')
+
+
+def _read_exactly(stream, size):
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def serve(stdin, stdout):
+    while True:
+        header = _read_exactly(stdin, HEADER.size)
+        if header is None:
+            return
+
+        payload = _read_exactly(stdin, HEADER.unpack(header)[0])
+        if payload is None:
+            return
+
+        try:
+            result = (json.loads(payload.decode('utf8')), None)
+        except Exception as exception:
+            result = (None, str(exception))
+
+        data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        stdout.write(HEADER.pack(len(data)))
+        stdout.write(data)
+        stdout.flush()
+
+
+if __name__ == '__main__':
+    serve(getattr(sys.stdin, 'buffer', sys.stdin), getattr(sys.stdout, 'buffer', sys.stdout))
@@ -0,0 +1,134 @@
+import random
+import time
+
+from collections import deque
+
+
+class EndpointFailover(object):
+    """Choose the ROS Bridge endpoint and delay of every reconnection attempt.
+    When an established connection is lost, the next endpoint is tried right away so a
+    standby bridge takes over without waiting; with a single endpoint it is retried after
+    ``initial_delay`` seconds instead. Every failed attempt also moves on to the next
+    endpoint right away. Only once every endpoint has failed in a row does the delay grow,
+    by ``factor`` up to ``max_delay``, with a random share of up to ``jitter`` taken off so
+    clients do not reconnect in lockstep. Once connected to a standby, the client stays
+    there until that connection is lost too.
+    Each outage is measured from the moment the connection was lost (or the first
+    attempt failed) until the connection is ready again and until the first message
+    is received on it.
+    Args:
+        endpoints (:obj:`list`): Endpoint URLs in order of preference.
+        initial_delay (:obj:`float`): Seconds before the first retry after a connection is lost.
+        factor (:obj:`float`): Growth of the delay after each round where every endpoint failed.
+        max_delay (:obj:`float`): Maximum seconds between two rounds of attempts.
+        jitter (:obj:`float`): Largest fraction of the delay taken off at random.
+        history (:obj:`int`): Number of past outages kept for the stats.
+    """
+
+    def __init__(self, endpoints, initial_delay=0.1, factor=2.0, max_delay=10.0, jitter=0.5, history=20):
+        if not endpoints:
+            raise ValueError('At least one endpoint is required')
+
+        self.endpoints = list(endpoints)
+        self.initial_delay = initial_delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+        self.index = 0
+        self.attempts = 0
+        self.failovers = 0
+        self.connects = 0
+        self.outages = deque(maxlen=history)
+
+        self._failures = 0
+        self._rounds = 0
+        self._outage = None
+
+    @property
+    def endpoint(self):
+        """URL of the endpoint currently used."""
+        return self.endpoints[self.index]
+
+    def next_attempt(self, was_connected):
+        """Plan the next connection attempt after a connection was lost or an attempt failed.
+        Args:
+            was_connected (:obj:`bool`): True if an established connection was lost,
+                False if the last attempt failed.
+        Returns:
+            tuple: ``(url, delay)`` of the endpoint to connect to and the seconds to wait first.
+        """
+        now = time.time()
+        if self._outage is None:
+            self._outage = {'started': now, 'endpoint': self.endpoint}
+
+        self.attempts += 1
+
+        if was_connected:
+            self._failures = 0
+            self._rounds = 0
+            if len(self.endpoints) == 1:
+                return self.endpoint, self._jittered(self.initial_delay)
+            self._next_endpoint()
+            return self.endpoint, 0.0
+
+        self._failures += 1
+        if len(self.endpoints) > 1:
+            self._next_endpoint()
+
+        # Try every endpoint back to back before backing off
+        if self._failures % len(self.endpoints):
+            return self.endpoint, 0.0
+
+        self._rounds += 1
+        delay = min(self.max_delay, self.initial_delay * self.factor ** self._rounds)
+        return self.endpoint, self._jittered(delay)
+
+    def connected(self):
+        """Record that the connection to the current endpoint is ready."""
+        self.connects += 1
+        self._failures = 0
+        self._rounds = 0
+
+        if self._outage is not None:
+            self._outage['time_to_connect'] = time.time() - self._outage['started']
+            self._outage['time_to_first_message'] = None
+            self._outage['recovered_on'] = self.endpoint
+
+    def message_received(self):
+        """Record that a message was received, closing the current outage on the first one."""
+        if self._outage is None or 'time_to_connect' not in self._outage:
+            return
+
+        outage, self._outage = self._outage, None
+        outage['time_to_first_message'] = time.time() - outage['started']
+        self.outages.append(outage)
+
+    def reset(self):
+        """Go back to the preferred endpoint, e.g. before connecting on demand."""
+        self.index = 0
+        self._failures = 0
+        self._rounds = 0
+
+    def stats(self):
+        """Get the reconnection counters and the recent outages.
+        Returns:
+            dict: ``endpoint``, ``attempts``, ``failovers`` and ``connects`` counters, ``outages``
+            with ``time_to_connect`` and ``time_to_first_message`` (in seconds) of each
+            recovered outage, and ``outage`` for the one in progress, if any.
+        """
+        return {
+            'endpoint': self.endpoint,
+            'attempts': self.attempts,
+            'failovers': self.failovers,
+            'connects': self.connects,
+            'outages': [dict(outage) for outage in self.outages],
+            'outage': dict(self._outage) if self._outage else None,
+        }
+
+    def _next_endpoint(self):
+        self.index = (self.index + 1) % len(self.endpoints)
+        self.failovers += 1
+
+    def _jittered(self, delay):
+        return delay * (1.0 - self.jitter * random.random())
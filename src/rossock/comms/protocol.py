@@ -1,5 +1,6 @@
 import json
 import logging
+import time
 
 from rossock.managers.rossock_core import Message
 
@@ -7,6 +8,26 @@ class RosBridgeException(Exception):
     """Exception raised on the ROS bridge communication."""
     pass
 
+def decode_message(payload):
+    """Decode a JSON ROS Bridge frame.
+    Args:
+        payload (:obj:`bytes`): Raw frame as received from the transport.
+    Returns:
+        :class:`.Message`: The decoded message, with the frame length as its ``size``.
+    """
+    message = Message(json.loads(payload.decode('utf8')))
+    message.size = len(payload)
+    return message
+
+def encode_message(message):
+    """Encode a ROS Bridge message as a JSON frame.
+    Args:
+        message (:class:`.Message`): ROS Bridge Message to encode.
+    Returns:
+        :obj:`bytes`: The encoded frame.
+    """
+    return json.dumps(dict(message)).encode('utf8')
+
 class RosBridgeProtocol(object):
     """Implements the websocket client protocol to encode/decode JSON ROS Bridge messages."""
 
@@ -16,10 +37,34 @@ class RosBridgeProtocol(object):
         self._pending_service_requests = {}
         self._message_handlers = {
             'publish': self._handle_publish,
+            'service_response': self._handle_service_response,
         }
 
     def on_message(self, payload):
-        message = Message(json.loads(payload.decode('utf8')))
+        dispatch = self.dispatch_message
+        tracer = getattr(self.factory, 'latency_tracer', None)
+        if tracer and tracer.sample():
+            dispatch = self._tracing_dispatch(tracer, time.time())
+
+        pipeline = getattr(self.factory, 'decode_pipeline', None)
+        if pipeline:
+            pipeline.feed(payload, dispatch)
+        else:
+            dispatch(decode_message(payload))
+
+    def _tracing_dispatch(self, tracer, received):
+        # The tracer is kept with the message so it is recorded even if tracing is disabled meanwhile
+        def _dispatch(message):
+            message.trace = (tracer, received, time.time())
+            self.dispatch_message(message)
+
+        return _dispatch
+
+    def dispatch_message(self, message):
+        """Hand a decoded message to the handler registered for its operation.
+        Args:
+            message (:class:`.Message`): Decoded ROS Bridge message.
+        """
         handler = self._message_handlers.get(message['op'], None)
         if not handler:
             raise RosBridgeException(
@@ -33,13 +78,22 @@ class RosBridgeProtocol(object):
             message (:class:`.Message`): ROS Bridge Message to send.
         """
         try:
-            json_message = json.dumps(dict(message)).encode('utf8')
-            self.send_message(json_message)
+            self.send_message(encode_message(message))
         except Exception as exception:
             # TODO: Check if it makes sense to raise exception again here
             # Since this is wrapped in many layers of indirection
             pass
 
+    def send_ros_service_request(self, message, callback, errback):
+        """Initiate a ROS service request through the ROS Bridge.
+        Args:
+            message (:class:`.Message`): ROS Bridge Message containing the service request.
+            callback: Callback invoked with the :class:`.Message` of the response.
+            errback: Callback invoked with the error values if the service call fails.
+        """
+        self._pending_service_requests[message['id']] = (callback, errback)
+        self.send_ros_message(message)
+
     def register_message_handlers(self, operation, handler):
         """Register a message handler for a specific operation type.
         Args:
@@ -53,4 +107,41 @@ class RosBridgeProtocol(object):
         self._message_handlers[operation] = handler
 
     def _handle_publish(self, message):
-        self.factory.emit(message['topic'], message['msg'])
+        emit = self.factory.emit
+        args = (message['topic'], message['msg'])
+
+        # Polling readers see the message as soon as it is decoded, even while it is queued
+        cache = getattr(self.factory, 'topic_cache', None)
+        if cache:
+            cache.update(*args)
+
+        trace = getattr(message, 'trace', None)
+        if trace is not None:
+            emit = self._traced_emit
+            args += trace
+
+        scheduler = getattr(self.factory, 'dispatch_scheduler', None)
+        if scheduler:
+            scheduler.submit(message['topic'], emit, args, getattr(message, 'size', 0))
+        else:
+            emit(*args)
+
+    def _traced_emit(self, topic, msg, tracer, received, decoded):
+        started = time.time()
+        try:
+            self.factory.emit(topic, msg)
+        finally:
+            tracer.record(topic, msg, received, decoded, started, time.time())
+
+    def _handle_service_response(self, message):
+        handlers = self._pending_service_requests.pop(message['id'], None)
+        if not handlers:
+            raise RosBridgeException(
+                'No handler registered for service request ID: "%s"' % message['id'])
+
+        callback, errback = handlers
+        if message.get('result', True) is False:
+            if errback:
+                errback(message.get('values'))
+        elif callback:
+            callback(Message(message.get('values')))
@@ -2,19 +2,20 @@ import threading
 
 from rossock.comms.protocol import RosBridgeProtocol
 from rossock.managers.event_emitter import EventEmitterMixin
-from rossock import misc
+from rossock.misc.logger import get_logger
 
 from twisted.internet import reactor
 from twisted.internet.error import ConnectionDone
 from twisted.internet.protocol import Protocol, ReconnectingClientFactory
 
+logger = get_logger('tcp')
+
 class TCPClientProtocol(RosBridgeProtocol, Protocol):
     def __init__(self, *args, **kwargs):
         super(TCPClientProtocol, self).__init__(*args, **kwargs)
 
     def connectionMade(self):
-        misc.formatted_print('RosBridgeTCPComms\t|\tConnection made', None, 'success')
-        misc.formatted_print('RosBridgeTCPComms\t|\tFactory is ready!',None,'success')
+        logger.info('Connection made')
         self.factory.connected = True
         self.factory.ready(self)
 
@@ -22,11 +23,12 @@ class TCPClientProtocol(RosBridgeProtocol, Protocol):
         self.on_message(data)
 
     def connectionLost(self, reason):
-        misc.formatted_print('RosBridgeTCPComms\t|\tConnection lost', None, 'error')
+        logger.warning('Connection lost: %s', reason.getErrorMessage())
+
+    def send_message(self, payload):
+        self.transport.write(payload)
 
-    def dataSend(self, data):
-        misc.formatted_print('RosBridgeTCPComms\t|\t Sending data')
-        self.transport.write(data)
+    dataSend = send_message
 
 class TCPClientFactory(EventEmitterMixin, ReconnectingClientFactory):
     """Factory to create instances of the ROS Bridge protocol built on top of Twisted."""
@@ -38,10 +40,14 @@ class TCPClientFactory(EventEmitterMixin, ReconnectingClientFactory):
         self._port = port
         self._proto = None
         self._manager = None
+        self.decode_pipeline = None
+        self.dispatch_scheduler = None
+        self.latency_tracer = None
+        self.topic_cache = None
         self.connected = False
 
     def connect(self):
-        misc.formatted_print('TCP: ' + str(self._host) + ':' + str(self._port) + '\t|\tConnecting..', None, 'connecting')
+        logger.info('Connecting to %s:%s', self._host, self._port)
         reactor.connectTCP(self._host, self._port, self)
 
     @property
@@ -97,7 +103,7 @@ class TwistedEventLoopManager(object):
         on a separate thread to avoid blocking."""
 
         if reactor.running:
-            misc.formatted_print('RosBridgeTCPComms\t|\tTwisted reactor is already running', None, 'error')
+            logger.error('Twisted reactor is already running')
             return
 
         self._thread = threading.Thread(target=reactor.run, args=(False,))
@@ -112,11 +118,20 @@ class TwistedEventLoopManager(object):
 
     def call_later(self, delay, callback):
         """Call the given function after a certain period of time has passed.
+        Safe to use from any thread, the delay is scheduled on the reactor thread.
         Args:
             delay (:obj:`int`): Number of seconds to wait before invoking the callback.
             callback (:obj:`callable`): Callable function to be invoked when the delay has elapsed.
         """
-        reactor.callLater(delay, callback)
+        reactor.callFromThread(reactor.callLater, delay, callback)
+
+    def call_from_thread(self, callback, *args):
+        """Call the given function on the event loop thread.
+        Safe to use from any thread, this is how other threads hand work to the reactor.
+        Args:
+            callback (:obj:`callable`): Callable function to be invoked on the reactor thread.
+        """
+        reactor.callFromThread(callback, *args)
 
     def call_in_thread(self, callback):
         """Call the given function on a thread.
@@ -128,4 +143,4 @@ class TwistedEventLoopManager(object):
     def terminate(self):
         """Signals the termination of the main event loop."""
         if reactor.running:
-            reactor.stop()
+            reactor.callFromThread(reactor.stop)
@@ -1,19 +1,20 @@
 import threading
-import websocket
 
 from autobahn.twisted.websocket import WebSocketClientFactory
 from autobahn.twisted.websocket import WebSocketClientProtocol
 from autobahn.twisted.websocket import connectWS
 from autobahn.websocket.util import create_url
 
+from rossock.comms.failover import EndpointFailover
 from rossock.comms.protocol import RosBridgeProtocol
 from rossock.managers.event_emitter import EventEmitterMixin
-from rossock import misc
+from rossock.misc.logger import get_logger
 
 from twisted.internet import reactor
-from twisted.internet.error import ConnectionDone
 from twisted.internet.protocol import Protocol, ReconnectingClientFactory
 
+logger = get_logger('websocket')
+
 class WebSocketClientProtocol(RosBridgeProtocol, WebSocketClientProtocol):
     def __init__(self, *args, **kwargs):
         super(WebSocketClientProtocol, self).__init__(*args, **kwargs)
@@ -22,42 +23,88 @@ class WebSocketClientProtocol(RosBridgeProtocol, WebSocketClientProtocol):
         pass
 
     def onOpen(self):
-        misc.formatted_print('RosBridgeWebSock\t|\tConnection made', None, 'success')
-        misc.formatted_print('RosBridgeWebSock\t|\tFactory is ready!',None,'success')
+        logger.info('Connection made to %s', self.factory.url)
         self.factory.ready(self)
 
     def onMessage(self, payload, isBinary):
         if isBinary:
             raise NotImplementedError('Add support for binary messages')
 
+        self.factory.failover.message_received()
+
         try:
             self.on_message(payload)
         except Exception:
-            pass
+            logger.exception('Failed to handle message')
 
     def onClose(self, wasClean, code, reason):
-        misc.formatted_print('RosBridgeWebSock\t|\tClosing socket.',None,'error')
+        logger.warning('Socket closed (code %s): %s', code, reason)
 
     def send_message(self, payload):
         return self.sendMessage(payload, isBinary=False, fragmentSize=None, sync=False, doNotCompress=False)
 
     def send_close(self):
+        # Closing on purpose, do not fail over to another endpoint
+        self.factory.stopTrying()
         self.sendClose()
 
 
 class WebSocketClientFactory(EventEmitterMixin, ReconnectingClientFactory, WebSocketClientFactory):
-    """Factory to create instances of the ROS Bridge protocol built on top of Twisted."""
+    """Factory to create instances of the ROS Bridge protocol built on top of Twisted.
+    Reconnection is driven by an :class:`.EndpointFailover` instead of the default
+    exponential backoff of ``ReconnectingClientFactory``: the factory fails over
+    between ``endpoints`` and, if ``ping_interval`` is set, pings the bridge so dead
+    connections are detected within ``ping_interval + ping_timeout`` seconds.
+    Args:
+        url (:obj:`str`): URL of the preferred endpoint.
+        endpoints (:obj:`list`): URLs of all endpoints in order of preference. Defaults to ``[url]``.
+        ping_interval (:obj:`float`): Seconds between pings, `0` to disable them (default).
+        ping_timeout (:obj:`float`): Seconds to wait for a pong before dropping the connection.
+            Autobahn schedules both with a granularity of one second.
+        connect_timeout (:obj:`float`): Seconds to wait for a connection attempt to succeed.
+    """
     protocol = WebSocketClientProtocol
 
-    def __init__(self, *args, **kwargs):
-        super(WebSocketClientFactory, self).__init__(*args, **kwargs)
+    def __init__(self, url, endpoints=None, ping_interval=0, ping_timeout=10.0, connect_timeout=10.0, **kwargs):
+        super(WebSocketClientFactory, self).__init__(url, **kwargs)
         self._proto = None
         self._manager = None
-        self.setProtocolOptions(closeHandshakeTimeout=5)
+        self.decode_pipeline = None
+        self.dispatch_scheduler = None
+        self.latency_tracer = None
+        self.topic_cache = None
+        self.connector = None
+        self.connect_timeout = connect_timeout
+        self.failover = EndpointFailover(endpoints or [url])
+        # Frames are validated when decoded as UTF-8, skip the much slower
+        # per-byte validation autobahn does on the reactor thread.
+        self.setProtocolOptions(closeHandshakeTimeout=5, utf8validateIncoming=False,
+                                openHandshakeTimeout=connect_timeout,
+                                autoPingInterval=ping_interval, autoPingTimeout=ping_timeout)
+        # Connections dropped while the reactor stops are not outages
+        reactor.addSystemEventTrigger('before', 'shutdown', self.stopTrying)
 
     def connect(self):
         """Establish WebSocket connection to the ROS server defined for this factory."""
-        self.connector = connectWS(self)
+        self.continueTrying = True
+        self.failover.reset()
+        self._connect_to(self.failover.endpoint)
+
+    def _connect_to(self, url):
+        self._callID = None
+        if url != self.url:
+            logger.warning('Failing over to %s', url)
+            self.setSessionParameters(url=url)
+
+        self.connector = connectWS(self, timeout=self.connect_timeout)
+
+    def _reconnect(self, connector, was_connected):
+        # Nothing to do if stopped, or if a new connection was already started meanwhile
+        if not self.continueTrying or connector is not self.connector:
+            return
+
+        url, delay = self.failover.next_attempt(was_connected)
+        self._callID = reactor.callLater(delay, self._connect_to, url)
 
     @property
     def is_connected(self):
@@ -75,24 +122,23 @@ class WebSocketClientFactory(EventEmitterMixin, ReconnectingClientFactory, WebSo
 
     def ready(self, proto):
         self._proto = proto
+        self.failover.connected()
         self.emit('ready', proto)
 
     def startedConnecting(self, connector):
         pass
 
     def clientConnectionLost(self, connector, reason):
-        self.emit('close', self._proto)
+        proto, self._proto = self._proto, None
+        self.emit('close', proto)
 
-        # Do not try to reconnect if the connection was closed cleanl
-        if reason.type is not ConnectionDone:
-            ReconnectingClientFactory.clientConnectionLost(self, connector, reason)
-
-        self._proto = None
+        # Reconnect unless the connection was closed on purpose,
+        # a bridge shutting down also closes the connection cleanly.
+        self._reconnect(connector, proto is not None)
 
     def clientConnectionFailed(self, connector, reason):
-        ReconnectingClientFactory.clientConnectionFailed(
-            self, connector, reason)
         self._proto = None
+        self._reconnect(connector, False)
 
     @property
     def manager(self):
@@ -120,7 +166,7 @@ class TwistedEventLoopManager(object):
         on a separate thread to avoid blocking."""
 
         if reactor.running:
-            misc.formatted_print('RosBridgeWebSockComms\t|\tTwisted reactor is already running', None, 'error')
+            logger.error('Twisted reactor is already running')
             return
 
         self._thread = threading.Thread(target=reactor.run, args=(False,))
@@ -135,11 +181,20 @@ class TwistedEventLoopManager(object):
 
     def call_later(self, delay, callback):
         """Call the given function after a certain period of time has passed.
+        Safe to use from any thread, the delay is scheduled on the reactor thread.
         Args:
             delay (:obj:`int`): Number of seconds to wait before invoking the callback.
             callback (:obj:`callable`): Callable function to be invoked when the delay has elapsed.
         """
-        reactor.callLater(delay, callback)
+        reactor.callFromThread(reactor.callLater, delay, callback)
+
+    def call_from_thread(self, callback, *args):
+        """Call the given function on the event loop thread.
+        Safe to use from any thread, this is how other threads hand work to the reactor.
+        Args:
+            callback (:obj:`callable`): Callable function to be invoked on the reactor thread.
+        """
+        reactor.callFromThread(callback, *args)
 
     def call_in_thread(self, callback):
         """Call the given function on a thread.
@@ -151,4 +206,4 @@ class TwistedEventLoopManager(object):
     def terminate(self):
         """Signals the termination of the main event loop."""
         if reactor.running:
-            reactor.stop()
+            reactor.callFromThread(reactor.stop)
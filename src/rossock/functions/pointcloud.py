@@ -0,0 +1,223 @@
+import base64
+
+import numpy
+
+# sensor_msgs/PointField datatypes
+POINT_FIELD_TYPES = {
+    1: 'i1', 2: 'u1', 3: 'i2', 4: 'u2',
+    5: 'i4', 6: 'u4', 7: 'f4', 8: 'f8',
+}
+POINT_FIELD_DATATYPES = dict((numpy.dtype(code).str[1:], datatype)
+                             for datatype, code in POINT_FIELD_TYPES.items())
+
+
+def cloud_dtype(cloud):
+    """Build the structured NumPy dtype of the points of a ``sensor_msgs/PointCloud2``."""
+    order = '>' if cloud.get('is_bigendian') else '<'
+    names, formats, offsets = [], [], []
+
+    for field in cloud['fields']:
+        names.append(field['name'])
+        code = order + POINT_FIELD_TYPES[field['datatype']]
+        count = field.get('count', 1)
+        formats.append((code, count) if count > 1 else code)
+        offsets.append(field['offset'])
+
+    return numpy.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                        'itemsize': cloud['point_step']})
+
+
+def cloud_to_array(cloud):
+    """Decode the ``data`` of a ``sensor_msgs/PointCloud2`` into a structured array of points.
+    Args:
+        cloud (:obj:`dict`): Cloud as received from the ROS Bridge, with ``data`` base64 encoded
+            or as a list of bytes.
+    Returns:
+        :obj:`numpy.ndarray`: One-dimensional structured array with one entry per point.
+    """
+    data = cloud['data']
+    if isinstance(data, (list, tuple)):
+        data = bytearray(data)
+    else:
+        data = base64.b64decode(data)
+
+    width, height = cloud['width'], cloud['height']
+    point_step, row_step = cloud['point_step'], cloud['row_step']
+    dtype = cloud_dtype(cloud)
+
+    if height <= 1 or row_step == width * point_step:
+        return numpy.frombuffer(data, dtype=dtype, count=width * height)
+
+    # Rows are padded, drop the padding before viewing the points
+    rows = numpy.frombuffer(data, dtype=numpy.uint8, count=height * row_step).reshape(height, row_step)
+    return numpy.ascontiguousarray(rows[:, :width * point_step]).view(dtype).reshape(-1)
+
+
+def array_to_cloud(points, template):
+    """Encode a structured array of points as an unorganized ``sensor_msgs/PointCloud2``.
+    Args:
+        points (:obj:`numpy.ndarray`): Structured array of points.
+        template (:obj:`dict`): Cloud whose header and remaining fields are reused.
+    Returns:
+        :obj:`dict`: Cloud with the ``data`` base64 encoded, as expected by the ROS Bridge.
+    """
+    points = numpy.ascontiguousarray(points)
+    fields = []
+
+    for name in points.dtype.names:
+        field_dtype, offset = points.dtype.fields[name][:2]
+        base, count = field_dtype, 1
+        if field_dtype.subdtype:
+            base, shape = field_dtype.subdtype
+            count = int(numpy.prod(shape))
+        fields.append({'name': name, 'offset': offset, 'count': count,
+                       'datatype': POINT_FIELD_DATATYPES[base.str[1:]]})
+
+    cloud = dict(template)
+    cloud.update({
+        'height': 1,
+        'width': len(points),
+        'fields': fields,
+        'is_bigendian': points.dtype.fields[points.dtype.names[0]][0].byteorder == '>',
+        'point_step': points.dtype.itemsize,
+        'row_step': points.dtype.itemsize * len(points),
+        'data': base64.b64encode(points.tobytes()).decode('ascii'),
+    })
+
+    return cloud
+
+
+def _xyz(points):
+    return points['x'], points['y'], points['z']
+
+
+class RangeCrop(object):
+    """Keep the points whose distance to the sensor is within ``[min_range, max_range]``."""
+
+    drops_invalid = True
+
+    def __init__(self, min_range=0.0, max_range=numpy.inf):
+        self.min_range = min_range
+        self.max_range = max_range
+
+    def __call__(self, points):
+        x, y, z = _xyz(points)
+        squared = x * x + y * y + z * z
+        return points[(squared >= self.min_range ** 2) & (squared <= self.max_range ** 2)]
+
+
+class ROICrop(object):
+    """Keep the points inside the axis-aligned box ``[min_bound, max_bound]``.
+    Args:
+        min_bound (:obj:`tuple`): Lower ``(x, y, z)`` corner of the box.
+        max_bound (:obj:`tuple`): Upper ``(x, y, z)`` corner of the box.
+        invert (:obj:`bool`): True to remove the points inside the box instead, e.g. the robot itself.
+    """
+
+    def __init__(self, min_bound, max_bound, invert=False):
+        self.min_bound = min_bound
+        self.max_bound = max_bound
+        self.invert = invert
+
+    @property
+    def drops_invalid(self):
+        return not self.invert
+
+    def __call__(self, points):
+        mask = numpy.ones(len(points), dtype=bool)
+        for axis, low, high in zip(_xyz(points), self.min_bound, self.max_bound):
+            mask &= (axis >= low) & (axis <= high)
+
+        return points[~mask if self.invert else mask]
+
+
+class VoxelGrid(object):
+    """Downsample the cloud to one point per occupied voxel.
+    Each remaining point is placed at the centroid of its voxel, other fields are
+    taken from one of the points of the voxel. Points with non-finite coordinates
+    are dropped.
+    Args:
+        leaf_size (:obj:`float`): Edge length of the voxels in meters.
+    """
+
+    drops_invalid = True
+
+    def __init__(self, leaf_size):
+        self.leaf_size = leaf_size
+
+    def __call__(self, points):
+        x, y, z = _xyz(points)
+        points = points[numpy.isfinite(x) & numpy.isfinite(y) & numpy.isfinite(z)]
+        if not len(points):
+            return points
+
+        coordinates = numpy.stack(_xyz(points), axis=1).astype(numpy.float64)
+        voxels = numpy.floor(coordinates / self.leaf_size).astype(numpy.int64)
+        voxels -= voxels.min(axis=0)
+
+        # Flatten the voxel coordinates into a single key per point
+        extent = voxels.max(axis=0) + 1
+        keys = (voxels[:, 0] * extent[1] + voxels[:, 1]) * extent[2] + voxels[:, 2]
+
+        # Sort once so every voxel is a contiguous run of points
+        order = numpy.argsort(keys)
+        keys = keys[order]
+        starts = numpy.concatenate(([0], numpy.flatnonzero(keys[1:] != keys[:-1]) + 1))
+        counts = numpy.diff(numpy.append(starts, len(keys)))
+        centroids = numpy.add.reduceat(coordinates[order], starts, axis=0) / counts[:, None]
+
+        reduced = points[order[starts]]
+        for axis, name in enumerate(('x', 'y', 'z')):
+            reduced[name] = centroids[:, axis]
+
+        return reduced
+
+
+class FieldProjection(object):
+    """Keep only the given fields, packed without padding.
+    Args:
+        fields (:obj:`list`): Names of the fields to keep, e.g. ``['x', 'y', 'z', 'intensity']``.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+
+    def __call__(self, points):
+        dtype = numpy.dtype([(name, points.dtype.fields[name][0]) for name in self.fields])
+        projected = numpy.empty(len(points), dtype=dtype)
+        for name in self.fields:
+            projected[name] = points[name]
+
+        return projected
+
+
+class PointCloudReducer(object):
+    """Apply a sequence of reduction stages to ``sensor_msgs/PointCloud2`` messages.
+    Stages are callables taking and returning a structured array of points, such as
+    :class:`RangeCrop`, :class:`ROICrop`, :class:`VoxelGrid` or :class:`FieldProjection`.
+    The cloud is decoded once, every stage runs vectorized over all points, and the
+    result is encoded back as an unorganized cloud.
+    Args:
+        stages (:obj:`list`): Stages applied in order.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    def __call__(self, cloud):
+        """Reduce a cloud.
+        Args:
+            cloud (:obj:`dict`): Cloud as received from the ROS Bridge.
+        Returns:
+            :obj:`dict`: The reduced cloud, in the same format.
+        """
+        points = cloud_to_array(cloud)
+        for stage in self.stages:
+            points = stage(points)
+
+        reduced = array_to_cloud(points, cloud)
+        # Points with non-finite coordinates never pass a crop or voxel grid
+        reduced['is_dense'] = cloud.get('is_dense', False) or any(
+            getattr(stage, 'drops_invalid', False) for stage in self.stages)
+
+        return reduced
@@ -0,0 +1,296 @@
+import threading
+
+import numpy
+
+
+class TFException(Exception):
+    """Exception raised when a transform cannot be looked up."""
+    pass
+
+
+def stamp_to_sec(stamp):
+    """Convert a ROS Bridge ``time`` dictionary to seconds."""
+    return stamp['secs'] + stamp['nsecs'] * 1e-9
+
+
+def quaternion_multiply(q, r):
+    """Hamilton product of two arrays of ``(x, y, z, w)`` quaternions."""
+    qx, qy, qz, qw = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    rx, ry, rz, rw = r[..., 0], r[..., 1], r[..., 2], r[..., 3]
+
+    return numpy.stack([
+        qw * rx + qx * rw + qy * rz - qz * ry,
+        qw * ry - qx * rz + qy * rw + qz * rx,
+        qw * rz + qx * ry - qy * rx + qz * rw,
+        qw * rw - qx * rx - qy * ry - qz * rz,
+    ], axis=-1)
+
+
+def quaternion_rotate(q, v):
+    """Rotate an array of vectors by an array of ``(x, y, z, w)`` quaternions."""
+    u = q[..., :3]
+    t = 2.0 * numpy.cross(u, v)
+    return v + q[..., 3:] * t + numpy.cross(u, t)
+
+
+def quaternion_slerp(q0, q1, fraction):
+    """Spherical linear interpolation between two arrays of quaternions."""
+    dot = numpy.sum(q0 * q1, axis=-1)
+
+    # Take the shortest path
+    q1 = numpy.where((dot < 0.0)[..., None], -q1, q1)
+    dot = numpy.abs(dot)
+
+    theta = numpy.arccos(numpy.clip(dot, -1.0, 1.0))
+    sin_theta = numpy.sin(theta)
+
+    # Fall back to linear interpolation where the quaternions are almost equal
+    close = sin_theta < 1e-6
+    sin_theta = numpy.where(close, 1.0, sin_theta)
+    w0 = numpy.where(close, 1.0 - fraction, numpy.sin((1.0 - fraction) * theta) / sin_theta)
+    w1 = numpy.where(close, fraction, numpy.sin(fraction * theta) / sin_theta)
+
+    result = w0[..., None] * q0 + w1[..., None] * q1
+    return result / numpy.linalg.norm(result, axis=-1)[..., None]
+
+
+class TransformHistory(object):
+    """Time-sorted history of the transform from a child frame to its parent.
+    Args:
+        parent (:obj:`str`): Parent frame id.
+        child (:obj:`str`): Child frame id.
+        max_history (:obj:`int`): Maximum number of transforms kept.
+        static (:obj:`bool`): True if the transform never changes and is valid at any time.
+    """
+
+    def __init__(self, parent, child, max_history, static=False):
+        self.parent = parent
+        self.child = child
+        self.max_history = max_history
+        self.static = static
+
+        # Arrays are twice the history so appends only compact once in a while
+        self._stamps = numpy.empty(2 * max_history)
+        self._translations = numpy.empty((2 * max_history, 3))
+        self._rotations = numpy.empty((2 * max_history, 4))
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def stamps(self):
+        return self._stamps[self._start:self._end]
+
+    @property
+    def latest(self):
+        return self._stamps[self._end - 1]
+
+    def insert(self, stamp, translation, rotation, cache_time=None):
+        """Add a transform, keeping the history sorted and bounded."""
+        if self.static:
+            self._start, self._end = 0, 0
+
+        if self._end == len(self._stamps):
+            self._compact()
+
+        # Transforms mostly arrive in order, only search when they do not.
+        # A stamp already in the history (e.g. a latched republish) overwrites it.
+        if len(self) and stamp <= self.latest:
+            index = self._start + numpy.searchsorted(self.stamps, stamp, side='left')
+            if self._stamps[index] == stamp:
+                self._translations[index] = translation
+                self._rotations[index] = rotation
+                return
+            for array in (self._stamps, self._translations, self._rotations):
+                array[index + 1:self._end + 1] = array[index:self._end].copy()
+        else:
+            index = self._end
+
+        self._stamps[index] = stamp
+        self._translations[index] = translation
+        self._rotations[index] = rotation
+        self._end += 1
+
+        if len(self) > self.max_history:
+            self._start = self._end - self.max_history
+
+        if cache_time is not None:
+            self._start += numpy.searchsorted(self.stamps, self.latest - cache_time)
+
+    def interpolate(self, times):
+        """Interpolate the transform at an array of times.
+        Returns:
+            tuple: ``(translations, rotations)`` arrays of shape ``(N, 3)`` and ``(N, 4)``.
+        """
+        count = len(times)
+
+        if self.static or len(self) == 1:
+            return (numpy.repeat(self._translations[self._end - 1:self._end], count, axis=0),
+                    numpy.repeat(self._rotations[self._end - 1:self._end], count, axis=0))
+
+        stamps = self.stamps
+        if times.min() < stamps[0] or times.max() > stamps[-1]:
+            raise TFException('Lookup would require extrapolation, %s to %s is available from %.3f to %.3f' % (
+                self.child, self.parent, stamps[0], stamps[-1]))
+
+        upper = numpy.clip(numpy.searchsorted(stamps, times), 1, len(stamps) - 1)
+        lower = upper - 1
+
+        # A zero-width interval would divide by zero, use its lower sample instead
+        width = stamps[upper] - stamps[lower]
+        fraction = numpy.where(width > 0, times - stamps[lower], 0.0) / numpy.where(width > 0, width, 1.0)
+
+        translations = self._translations[self._start:self._end]
+        rotations = self._rotations[self._start:self._end]
+
+        return (translations[lower] + fraction[:, None] * (translations[upper] - translations[lower]),
+                quaternion_slerp(rotations[lower], rotations[upper], fraction))
+
+    def _compact(self):
+        size = len(self)
+        for array in (self._stamps, self._translations, self._rotations):
+            array[:size] = array[self._start:self._end]
+        self._start, self._end = 0, size
+
+
+class TFBuffer(object):
+    """Cache of the transform tree received on ``/tf`` and ``/tf_static``.
+    Every child frame keeps a bounded, time-sorted history of its transform to its
+    parent. Lookups interpolate each transform along the chain between two frames
+    and compose them, for a single time or for an array of times at once.
+    Safe to feed from the reactor thread while other threads look transforms up.
+    Args:
+        cache_time (:obj:`float`): Seconds of history kept behind the newest transform of each frame.
+        max_history (:obj:`int`): Maximum number of transforms kept per frame.
+    """
+
+    def __init__(self, cache_time=10.0, max_history=1000):
+        self.cache_time = cache_time
+        self.max_history = max_history
+
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    @property
+    def frames(self):
+        """List of all known frame ids."""
+        with self._lock:
+            parents = set(history.parent for history in self._frames.values())
+            return sorted(parents.union(self._frames))
+
+    def feed(self, message, static=False):
+        """Store the transforms of a ``tf2_msgs/TFMessage``.
+        Args:
+            message (:obj:`dict`): Message as received from the ROS Bridge.
+            static (:obj:`bool`): True for messages received on ``/tf_static``.
+        """
+        with self._lock:
+            for transform in message['transforms']:
+                self._insert(transform, static)
+
+    def lookup(self, target, source, time=0.0):
+        """Look up the transform that maps coordinates in ``source`` to ``target``.
+        Args:
+            target (:obj:`str`): Frame to transform into.
+            source (:obj:`str`): Frame to transform from.
+            time (:obj:`float` or :obj:`numpy.ndarray`): Time in seconds or array of times.
+                Defaults to `0`, meaning the latest time available for the whole chain.
+        Returns:
+            tuple: ``(translation, rotation)`` with the rotation as an ``(x, y, z, w)``
+            quaternion, or arrays of them with one row per time.
+        """
+        times = numpy.atleast_1d(numpy.asarray(time, dtype=numpy.float64))
+        target, source = target.lstrip('/'), source.lstrip('/')
+
+        with self._lock:
+            source_chain, target_chain = self._chains(target, source)
+
+            if numpy.ndim(time) == 0 and time == 0:
+                times = numpy.array([self._latest_common_time(source_chain + target_chain)])
+
+            translation, rotation = self._compose(source_chain, times)
+            target_translation, target_rotation = self._compose(target_chain, times)
+
+        # Invert the target chain and apply it after the source chain
+        inverse = target_rotation * numpy.array([-1.0, -1.0, -1.0, 1.0])
+        rotation = quaternion_multiply(inverse, rotation)
+        translation = quaternion_rotate(inverse, translation - target_translation)
+
+        if numpy.ndim(time) == 0:
+            return translation[0], rotation[0]
+
+        return translation, rotation
+
+    def transform_points(self, points, target, source, time=0.0):
+        """Transform an ``(N, 3)`` array of points from ``source`` to ``target``."""
+        translation, rotation = self.lookup(target, source, time)
+        rotation = numpy.broadcast_to(rotation, numpy.shape(points)[:-1] + (4,))
+        return quaternion_rotate(rotation, numpy.asarray(points, dtype=numpy.float64)) + translation
+
+    def clear(self):
+        """Forget all transforms."""
+        with self._lock:
+            self._frames.clear()
+
+    def _insert(self, transform, static):
+        parent = transform['header']['frame_id'].lstrip('/')
+        child = transform['child_frame_id'].lstrip('/')
+
+        history = self._frames.get(child)
+        if history is None or history.parent != parent or history.static != static:
+            history = self._frames[child] = TransformHistory(parent, child, self.max_history, static)
+
+        translation = transform['transform']['translation']
+        rotation = transform['transform']['rotation']
+
+        history.insert(stamp_to_sec(transform['header']['stamp']),
+                       (translation['x'], translation['y'], translation['z']),
+                       (rotation['x'], rotation['y'], rotation['z'], rotation['w']),
+                       self.cache_time)
+
+    def _chain_to_root(self, frame):
+        chain = []
+        while frame in self._frames:
+            chain.append(frame)
+            frame = self._frames[frame].parent
+            if len(chain) > len(self._frames):
+                raise TFException('Loop detected in the transform tree at ' + frame)
+
+        return chain, frame
+
+    def _chains(self, target, source):
+        source_chain, source_root = self._chain_to_root(source)
+        target_chain, target_root = self._chain_to_root(target)
+
+        if source_root != target_root:
+            for frame in (source, target):
+                if frame not in self._frames and not any(h.parent == frame for h in self._frames.values()):
+                    raise TFException('Frame %s does not exist' % frame)
+
+            raise TFException('Frames %s and %s are not connected' % (source, target))
+
+        # Drop the part of the chains both frames share
+        while source_chain and target_chain and source_chain[-1] == target_chain[-1]:
+            source_chain.pop()
+            target_chain.pop()
+
+        return source_chain, target_chain
+
+    def _latest_common_time(self, chain):
+        stamps = [self._frames[frame].latest for frame in chain if not self._frames[frame].static]
+        return min(stamps) if stamps else 0.0
+
+    def _compose(self, chain, times):
+        translation = numpy.zeros((len(times), 3))
+        rotation = numpy.zeros((len(times), 4))
+        rotation[:, 3] = 1.0
+
+        # Walk up from the frame towards the common ancestor
+        for frame in chain:
+            parent_translation, parent_rotation = self._frames[frame].interpolate(times)
+            translation = quaternion_rotate(parent_rotation, translation) + parent_translation
+            rotation = quaternion_multiply(parent_rotation, rotation)
+
+        return translation, rotation
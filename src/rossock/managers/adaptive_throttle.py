@@ -0,0 +1,129 @@
+import time
+
+
+class AdaptiveThrottle(object):
+    """Track how fast a topic consumer keeps up and derive a bridge-side throttle rate.
+    The consumer is considered to be lagging when the smoothed callback duration takes
+    up more than ``lag_ratio`` of the current message interval, or when more than
+    ``max_pending`` messages are waiting to be handled. Waiting messages are the ones
+    queued by the client behind the one being handled, in the decode pipeline and the
+    priority dispatch lanes; without either, frames are handled as they are read and
+    only the callback duration applies. While lagging, the throttle
+    rate is raised so that the bridge only sends what the consumer can process. While
+    the callback duration stays below ``recover_ratio`` of the current rate, the rate
+    is halved step by step, and it snaps back to ``base_rate`` once the next halving
+    would leave it less than ``min_step`` ms above it. A callback too slow to pass the
+    ``recover_ratio`` test at some rate keeps that rate, which is the hysteresis that
+    stops the rate from oscillating.
+    Args:
+        base_rate (:obj:`int`): Throttle rate (in ms) requested when the consumer keeps up.
+        max_rate (:obj:`int`): Upper bound (in ms) of the adapted throttle rate.
+        lag_ratio (:obj:`float`): Fraction of the message interval above which the consumer is lagging.
+        recover_ratio (:obj:`float`): Fraction of the message interval below which the rate is relaxed.
+        max_pending (:obj:`int`): Number of unhandled messages above which the consumer is lagging.
+        smoothing (:obj:`float`): Weight of the newest sample in the moving averages.
+        min_interval (:obj:`float`): Minimum number of seconds between two adjustments.
+        min_step (:obj:`int`): Smallest rate (in ms) kept above ``base_rate`` while relaxing.
+    """
+
+    def __init__(self, base_rate=0, max_rate=2000, lag_ratio=0.8, recover_ratio=0.3,
+                 max_pending=2, smoothing=0.2, min_interval=1.0, min_step=10):
+        if not 0 < recover_ratio < lag_ratio:
+            raise ValueError('recover_ratio must be positive and lower than lag_ratio')
+
+        self.base_rate = base_rate
+        self.max_rate = max_rate
+        self.lag_ratio = lag_ratio
+        self.recover_ratio = recover_ratio
+        self.max_pending = max_pending
+        self.smoothing = smoothing
+        self.min_interval = min_interval
+        self.min_step = min_step
+
+        self.rate = base_rate
+        self.pending = 0
+        self.avg_duration = None
+        self.avg_interval = None
+
+        self._last_arrival = None
+        self._last_change = 0.0
+
+    @property
+    def is_lagging(self):
+        """Indicate if the consumer currently falls behind the incoming messages.
+        Returns:
+            bool: True if the consumer is lagging, False otherwise.
+        """
+        if self.pending > self.max_pending:
+            return True
+
+        if self.avg_duration is None or not self.avg_interval:
+            return False
+
+        return self.avg_duration > self.lag_ratio * self.avg_interval
+
+    def message_received(self, now=None, queued=0):
+        """Account for a message whose callback is about to run.
+        Args:
+            queued (:obj:`int`): Number of messages of the topic still queued behind this one.
+        """
+        now = time.time() if now is None else now
+
+        if self._last_arrival is not None:
+            self.avg_interval = self._smooth(self.avg_interval, now - self._last_arrival)
+
+        self._last_arrival = now
+        self.pending = queued + 1
+
+    def message_handled(self, duration, now=None):
+        """Account for a message whose callback has completed.
+        Args:
+            duration (:obj:`float`): Seconds spent in the callback.
+        Returns:
+            int: The new throttle rate (in ms) if it should be changed, ``None`` otherwise.
+        """
+        now = time.time() if now is None else now
+
+        self.pending = max(0, self.pending - 1)
+        self.avg_duration = self._smooth(self.avg_duration, duration)
+
+        if now - self._last_change < self.min_interval:
+            return None
+
+        rate = self._next_rate()
+        if rate == self.rate:
+            return None
+
+        self.rate = rate
+        self._last_change = now
+
+        return rate
+
+    def reset(self):
+        """Forget all measurements and go back to the base rate."""
+        self.rate = self.base_rate
+        self.pending = 0
+        self.avg_duration = None
+        self.avg_interval = None
+        self._last_arrival = None
+        self._last_change = 0.0
+
+    def _next_rate(self):
+        duration_ms = int(self.avg_duration * 1000)
+
+        if self.is_lagging:
+            # Leave some headroom so the consumer can drain whatever is still queued
+            target = int(duration_ms / self.lag_ratio)
+            return min(self.max_rate, max(target, self.rate * 2, 1))
+
+        if self.rate > self.base_rate and duration_ms < self.recover_ratio * self.rate:
+            rate = self.rate // 2
+            return rate if rate - self.base_rate >= self.min_step else self.base_rate
+
+        return self.rate
+
+    def _smooth(self, average, sample):
+        if average is None:
+            return sample
+
+        return average + self.smoothing * (sample - average)
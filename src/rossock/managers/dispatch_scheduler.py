@@ -0,0 +1,199 @@
+import time
+
+from collections import deque
+
+from twisted.internet import reactor
+
+from rossock.misc.logger import get_logger
+
+logger = get_logger('dispatch')
+
+
+class DispatchScheduler(object):
+    """Dispatch inbound messages through weighted priority lanes on the reactor thread.
+    Every topic belongs to one of the ``PRIORITIES`` lanes (``normal`` unless configured).
+    A message is dispatched right away when nothing is queued on its lane or on any
+    higher priority lane, so priorities cost nothing until there is something to
+    preempt. Otherwise it is queued and drained on the next reactor iteration, ordered
+    by priority with everything else waiting. Lanes are served by smooth weighted round robin, and the drain yields
+    back to the reactor after ``time_slice`` seconds so that newly received high priority
+    messages can overtake a backlog of bulk messages. A lane whose oldest message has waited more
+    than ``max_wait`` seconds is served first, so bulk lanes are never starved.
+    Messages of the same topic are always dispatched in the order they were received.
+    Queued messages are accounted in the ``dispatch`` buffer of the memory budget,
+    the oldest queued messages of a topic are shed first when it is exceeded.
+    Args:
+        weights (:obj:`dict`): Relative share of dispatches per priority.
+        max_wait (:obj:`float`): Seconds after which a waiting message is served regardless of priority.
+        time_slice (:obj:`float`): Seconds of callbacks run before yielding back to the reactor.
+        budget (:class:`.MemoryBudget`): Memory budget of the client, or `None`.
+    """
+
+    PRIORITIES = ('high', 'normal', 'bulk')
+    DEFAULT_WEIGHTS = {'high': 8, 'normal': 4, 'bulk': 1}
+    BUFFER = 'dispatch'
+
+    def __init__(self, weights=None, max_wait=0.25, time_slice=0.005, budget=None):
+        self.weights = dict(self.DEFAULT_WEIGHTS)
+        self.weights.update(weights or {})
+        self.max_wait = max_wait
+        self.time_slice = time_slice
+
+        self._priorities = {}
+        self._lanes = dict((priority, deque()) for priority in self.PRIORITIES)
+        self._credits = dict((priority, 0) for priority in self.PRIORITIES)
+        self._queued = {}
+        self._scheduled = False
+        self._dispatching = False
+
+        self._budget = budget
+        if budget:
+            budget.register(self.BUFFER, self._evict)
+
+    @property
+    def pending(self):
+        """Number of messages waiting to be dispatched."""
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def queued(self, topic):
+        """Number of messages of a topic waiting to be dispatched."""
+        return len(self._queued.get(topic, ()))
+
+    def set_priority(self, topic, priority):
+        """Assign a topic to a priority lane.
+        Args:
+            topic (:obj:`str`): Topic name, e.g. ``/tf``.
+            priority (:obj:`str`): One of ``PRIORITIES``, or `None` to return the topic to the default lane.
+        """
+        if priority is None:
+            self._priorities.pop(topic, None)
+            return
+
+        if priority not in self.PRIORITIES:
+            raise ValueError('Unsupported priority. Must be one of: ' + str(self.PRIORITIES))
+
+        self._priorities[topic] = priority
+
+    def get_priority(self, topic):
+        """Get the priority lane of a topic."""
+        return self._priorities.get(topic, 'normal')
+
+    def submit(self, topic, callback, args=(), size=0):
+        """Queue ``callback(*args)`` on the lane of ``topic``.
+        Must be called from the reactor thread.
+        Args:
+            topic (:obj:`str`): Topic name of the message.
+            callback (:obj:`callable`): Callable dispatching the message.
+            args (:obj:`tuple`): Arguments of the callback.
+            size (:obj:`int`): Size of the message in bytes, accounted while it is queued.
+        """
+        priority = self.get_priority(topic)
+        lane = self._lanes[priority]
+
+        if not self._dispatching and not self._waiting_ahead(priority):
+            self._dispatch(callback, args)
+            return
+
+        if self._budget and not self._budget.reserve(self.BUFFER, topic, size):
+            return
+
+        entry = [time.time(), topic, size, callback, args]
+        lane.append(entry)
+        self._queued.setdefault(topic, deque()).append(entry)
+
+        if not self._scheduled:
+            self._scheduled = True
+            reactor.callLater(0, self._run)
+
+    def _waiting_ahead(self, priority):
+        for name in self.PRIORITIES:
+            if self._lanes[name]:
+                return True
+            if name == priority:
+                return False
+
+    def clear(self):
+        """Drop every message waiting to be dispatched."""
+        for lane in self._lanes.values():
+            while lane:
+                self._pop(lane)
+
+    def _run(self):
+        self._scheduled = False
+        deadline = time.time() + self.time_slice
+
+        while True:
+            priority = self._next_lane()
+            if priority is None:
+                return
+
+            _, _, _, callback, args = self._pop(self._lanes[priority])
+            if callback is not None:
+                self._dispatch(callback, args)
+
+            if time.time() >= deadline:
+                break
+
+        if self.pending and not self._scheduled:
+            self._scheduled = True
+            reactor.callLater(0, self._run)
+
+    def _pop(self, lane):
+        entry = lane.popleft()
+        _, topic, size, callback, _ = entry
+
+        # Evicted entries were already removed from the index and the budget
+        if callback is not None:
+            queued = self._queued[topic]
+            queued.popleft()
+            if not queued:
+                del self._queued[topic]
+            if self._budget:
+                self._budget.release(self.BUFFER, topic, size)
+
+        return entry
+
+    def _evict(self, topic):
+        queued = self._queued.get(topic)
+        if not queued or not queued[0][2]:
+            return 0
+
+        entry = queued.popleft()
+        if not queued:
+            del self._queued[topic]
+
+        # Leave the entry in its lane, it is skipped when its turn comes
+        entry[3] = entry[4] = None
+        return entry[2]
+
+    def _dispatch(self, callback, args):
+        self._dispatching = True
+        try:
+            callback(*args)
+        except Exception as exception:
+            logger.exception('Callback failed: %s', exception)
+        finally:
+            self._dispatching = False
+
+    def _next_lane(self):
+        ready = [priority for priority in self.PRIORITIES if self._lanes[priority]]
+        if not ready:
+            return None
+
+        # Starvation protection, the lane holding the oldest overdue message goes first
+        oldest = min(ready, key=lambda priority: self._lanes[priority][0][0])
+        if time.time() - self._lanes[oldest][0][0] > self.max_wait:
+            return oldest
+
+        # Smooth weighted round robin over the lanes that have messages
+        total = 0
+        best = None
+        for priority in ready:
+            self._credits[priority] += self.weights[priority]
+            total += self.weights[priority]
+            if best is None or self._credits[priority] > self._credits[best]:
+                best = priority
+
+        self._credits[best] -= total
+
+        return best
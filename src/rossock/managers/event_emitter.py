@@ -106,7 +106,9 @@ class EventEmitterMixin(object):
         handled = False
 
         with self._event_lock:
-            for f in list(self._events[event].values()):
+            # Do not let the defaultdict create an entry for events nobody listens to
+            handlers = self._events.get(event)
+            for f in list(handlers.values()) if handlers else ():
                 result = f(*args, **kwargs)
 
                 # If f was a coroutine function, we need to schedule it and
@@ -149,7 +151,8 @@ class EventEmitterMixin(object):
         with self._event_lock:
             def _wrapper(f):
                 def g(*args, **kwargs):
-                    self.remove_listener(event, f)
+                    # Might already be gone if removed while the event was being emitted
+                    self._remove(event, f, missing_ok=True)
                     # f may return a coroutine, so we need to return that
                     # result here so that emit can schedule it
                     return f(*args, **kwargs)
@@ -164,11 +167,25 @@ class EventEmitterMixin(object):
 
     def off(self, event, f):
         """Removes the function ``f`` from ``event``."""
-        self._events[event].pop(f)
+        self._remove(event, f)
 
     def remove_listener(self, event, f):
         """Removes the function ``f`` from ``event``."""
-        self._events[event].pop(f)
+        self._remove(event, f)
+
+    def _remove(self, event, f, missing_ok=False):
+        with self._event_lock:
+            handlers = self._events.get(event)
+            if handlers is None or f not in handlers:
+                if missing_ok:
+                    return
+                raise KeyError(f)
+
+            handlers.pop(f)
+
+            # Drop the event itself once its last listener is gone
+            if not handlers:
+                del self._events[event]
 
     def remove_all_listeners(self, event=None):
         """Remove all listeners attached to ``event``.
@@ -176,11 +193,12 @@ class EventEmitterMixin(object):
         """
         with self._event_lock:
             if event is not None:
-                self._events[event] = OrderedDict()
+                self._events.pop(event, None)
             else:
                 self._events = defaultdict(OrderedDict)
 
     def listeners(self, event):
         """Returns a list of all listeners registered to the ``event``.
         """
-        return list(self._events[event].keys())
+        handlers = self._events.get(event)
+        return list(handlers.keys()) if handlers else []
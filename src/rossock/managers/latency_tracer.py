@@ -0,0 +1,138 @@
+import threading
+
+from collections import OrderedDict, deque
+
+
+def _stamp(msg):
+    """Find the ``header.stamp`` of a message in seconds, or `None`."""
+    header = msg.get('header')
+    if header is None:
+        # tf2_msgs/TFMessage and similar arrays of stamped messages
+        transforms = msg.get('transforms')
+        header = transforms[0].get('header') if transforms else None
+
+    stamp = header.get('stamp') if header else None
+    if not stamp or not stamp.get('secs'):
+        return None
+
+    return stamp['secs'] + stamp.get('nsecs', 0) * 1e-9
+
+
+class LatencyTracer(object):
+    """Record where inbound messages spend their time, per topic.
+    One frame in ``sample_every`` is traced: the protocol stamps it when it is
+    received and once it is decoded, then the dispatch stamps it before and after
+    the callbacks run. The stages recorded for each traced message are:
+    - ``network``: from its ``header.stamp`` to being received, which covers the
+      publisher, the bridge, the network and frames waiting to be read while the
+      reactor is busy. Only available for stamped messages.
+    - ``decode``: JSON decoding, including the wait for a decode worker.
+    - ``queue``: waiting for dispatch, e.g. on a bulk priority lane.
+    - ``callback``: running the subscriber callbacks.
+    - ``total``: from its ``header.stamp`` (or reception) until the callbacks are done.
+    Stamps are set by the bridge side clock, so they are corrected by the offset
+    estimated from :meth:`clock_sample`, keeping the sample with the shortest round
+    trip as it bounds the error best.
+    Args:
+        sample_every (:obj:`int`): Trace one frame out of this many.
+        window (:obj:`int`): Number of traced messages kept per topic.
+        max_topics (:obj:`int`): Number of topics kept, the one traced least recently is forgotten
+            first, e.g. when topics matched by a pattern come and go.
+        clock_samples (:obj:`int`): Number of recent clock samples the offset is estimated from.
+    """
+
+    STAGES = ('network', 'decode', 'queue', 'callback', 'total')
+
+    def __init__(self, sample_every=10, window=1000, max_topics=100, clock_samples=8):
+        self.sample_every = sample_every
+        self.window = window
+        self.max_topics = max_topics
+        self.offset = 0.0
+        self.offset_error = None
+
+        self._counter = 0
+        self._topics = OrderedDict()
+        self._clock = deque(maxlen=clock_samples)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """Decide whether the next frame is traced.
+        Returns:
+            bool: True if the frame must be traced.
+        """
+        self._counter += 1
+        if self._counter >= self.sample_every:
+            self._counter = 0
+            return True
+
+        return False
+
+    def clock_sample(self, sent, bridge_time, received):
+        """Update the clock offset with the bridge time obtained during a round trip.
+        Args:
+            sent (:obj:`float`): Local time the request was sent.
+            bridge_time (:obj:`float`): Bridge time in the response.
+            received (:obj:`float`): Local time the response was received.
+        """
+        with self._lock:
+            self._clock.append((received - sent, bridge_time - (sent + received) / 2.0))
+            round_trip, self.offset = min(self._clock)
+            self.offset_error = round_trip / 2.0
+
+    def record(self, topic, msg, received, decoded, started, done):
+        """Record the timestamps of a traced message.
+        Args:
+            topic (:obj:`str`): Topic name.
+            msg (:obj:`dict`): Message as received from the ROS Bridge.
+            received (:obj:`float`): Local time the frame was received.
+            decoded (:obj:`float`): Local time the frame was decoded.
+            started (:obj:`float`): Local time the callbacks started.
+            done (:obj:`float`): Local time the callbacks returned.
+        """
+        stamp = _stamp(msg)
+        network = None
+        origin = received
+        if stamp is not None:
+            origin = stamp - self.offset
+            network = received - origin
+
+        sample = (network, decoded - received, started - decoded, done - started, done - origin)
+
+        with self._lock:
+            samples = self._topics.pop(topic, None)
+            if samples is None:
+                samples = deque(maxlen=self.window)
+                while len(self._topics) >= self.max_topics:
+                    self._topics.popitem(last=False)
+            # Keep the topics ordered from the least to the most recently traced
+            self._topics[topic] = samples
+            samples.append(sample)
+
+    def percentiles(self, topic=None, percentiles=(50, 90, 99)):
+        """Get latency percentiles per topic and stage.
+        Args:
+            topic (:obj:`str`): Only report this topic. Defaults to `None`, all topics.
+            percentiles (:obj:`tuple`): Percentiles to compute.
+        Returns:
+            dict: Per topic, the number of ``samples`` and for each of ``STAGES`` a dictionary
+            of percentile to seconds. Stages without samples are omitted.
+        """
+        with self._lock:
+            topics = dict((name, list(samples)) for name, samples in self._topics.items()
+                          if topic is None or name == topic)
+
+        report = {}
+        for name, samples in topics.items():
+            entry = report[name] = {'samples': len(samples)}
+            for index, stage in enumerate(self.STAGES):
+                values = sorted(sample[index] for sample in samples if sample[index] is not None)
+                if values:
+                    entry[stage] = dict((percentile, values[min(len(values) - 1, int(percentile / 100.0 * len(values)))])
+                                        for percentile in percentiles)
+
+        return report
+
+    def clear(self):
+        """Forget all traced messages."""
+        with self._lock:
+            self._topics.clear()
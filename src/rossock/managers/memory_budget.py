@@ -0,0 +1,167 @@
+import threading
+
+from collections import defaultdict
+
+
+class MemoryBudget(object):
+    """Account the bytes held in the client buffers against global and per-topic budgets.
+    Buffers reserve the size of every message they hold and release it once the
+    message leaves them. When a reservation would exceed the budget of its topic,
+    the buffer first evicts its own oldest messages of that topic. When it would
+    exceed the global budget, the buffer evicts the oldest messages of the topic
+    using most of its bytes. A message that still does not fit is dropped.
+    Evicted and dropped messages are counted per buffer and per topic. Once a topic
+    holds nothing in a buffer its counts are folded into the totals of the buffer,
+    so topics that come and go do not accumulate entries.
+    Args:
+        max_bytes (:obj:`int`): Budget shared by all buffers. Defaults to `None`, unlimited.
+        topic_max_bytes (:obj:`int`): Default budget of each topic across all buffers.
+            Defaults to `None`, unlimited.
+    """
+
+    def __init__(self, max_bytes=None, topic_max_bytes=None):
+        self.max_bytes = max_bytes
+        self.topic_max_bytes = topic_max_bytes
+
+        self._lock = threading.RLock()
+        self._evictors = {}
+        self._topic_limits = {}
+        self._total = 0
+        self._used = defaultdict(int)
+        self._held = defaultdict(int)
+        self._topic_used = defaultdict(int)
+        self._dropped = defaultdict(int)
+        self._dropped_bytes = defaultdict(int)
+        self._buffer_dropped = defaultdict(int)
+        self._buffer_dropped_bytes = defaultdict(int)
+
+    @property
+    def used(self):
+        """Number of bytes currently held in all buffers."""
+        return self._total
+
+    def register(self, buffer, evict=None):
+        """Register a buffer.
+        Args:
+            buffer (:obj:`str`): Name of the buffer.
+            evict (:obj:`callable`): Called with a topic name, removes the oldest message of
+                that topic from the buffer and returns its size, or ``0`` if there is none.
+                Buffers that cannot evict only drop new messages.
+        """
+        self._evictors[buffer] = evict
+
+    def set_topic_budget(self, topic, max_bytes):
+        """Set the budget of a single topic, overriding ``topic_max_bytes``, or `None` to reset it."""
+        with self._lock:
+            if max_bytes is None:
+                self._topic_limits.pop(topic, None)
+            else:
+                self._topic_limits[topic] = max_bytes
+
+    def reserve(self, buffer, topic, size):
+        """Account for a message entering a buffer, evicting older messages if needed.
+        Must be called without holding any lock the buffer's evict callback takes.
+        Returns:
+            bool: True if the message fits, False if it must be dropped.
+        """
+        with self._lock:
+            limit = self._topic_limits.get(topic, self.topic_max_bytes)
+
+            if (limit is not None and size > limit) or (self.max_bytes is not None and size > self.max_bytes):
+                self._count_drop(buffer, topic, size)
+                return False
+
+            while limit is not None and self._topic_used.get(topic, 0) + size > limit:
+                if not self._evict(buffer, topic):
+                    self._count_drop(buffer, topic, size)
+                    return False
+
+            while self.max_bytes is not None and self._total + size > self.max_bytes:
+                if not self._evict(buffer, self._largest_topic(buffer)):
+                    self._count_drop(buffer, topic, size)
+                    return False
+
+            self._account(buffer, topic, size, 1)
+            return True
+
+    def release(self, buffer, topic, size):
+        """Account for a message leaving a buffer."""
+        with self._lock:
+            self._account(buffer, topic, -size, -1)
+
+    def stats(self):
+        """Get the memory held and shed per buffer and per topic.
+        Returns:
+            dict: Totals, then ``buffers`` and ``topics`` with ``bytes``, ``messages``,
+            ``dropped`` and ``dropped_bytes`` each. Topics are only listed while they hold
+            messages, the counts of the buffers include every topic.
+        """
+        with self._lock:
+            buffers = {}
+            topics = {}
+
+            for buffer in set(self._buffer_dropped):
+                buffers[buffer] = {'bytes': 0, 'messages': 0, 'dropped': self._buffer_dropped[buffer],
+                                   'dropped_bytes': self._buffer_dropped_bytes[buffer]}
+
+            keys = set(self._held).union(self._dropped)
+            for buffer, topic in keys:
+                key = (buffer, topic)
+                values = (self._used.get(key, 0), self._held.get(key, 0),
+                          self._dropped.get(key, 0), self._dropped_bytes.get(key, 0))
+
+                for group, name in ((buffers, buffer), (topics, topic)):
+                    entry = group.setdefault(name, {'bytes': 0, 'messages': 0, 'dropped': 0, 'dropped_bytes': 0})
+                    for field, value in zip(('bytes', 'messages', 'dropped', 'dropped_bytes'), values):
+                        entry[field] += value
+
+            return {
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'topic_max_bytes': self.topic_max_bytes,
+                'buffers': buffers,
+                'topics': topics,
+            }
+
+    def _evict(self, buffer, topic):
+        evict = self._evictors.get(buffer)
+        if topic is None or evict is None:
+            return False
+
+        size = evict(topic)
+        if not size:
+            return False
+
+        self._account(buffer, topic, -size, -1)
+        self._count_drop(buffer, topic, size)
+        return True
+
+    def _largest_topic(self, buffer):
+        candidates = [(used, topic) for (name, topic), used in self._used.items() if name == buffer and used > 0]
+        return max(candidates)[1] if candidates else None
+
+    def _account(self, buffer, topic, size, messages):
+        key = (buffer, topic)
+        self._total += size
+        self._topic_used[topic] += size
+        self._used[key] += size
+        self._held[key] += messages
+
+        # Do not keep entries around for topics that are gone
+        if not self._held[key]:
+            del self._used[key]
+            del self._held[key]
+            if key in self._dropped:
+                self._buffer_dropped[buffer] += self._dropped.pop(key)
+                self._buffer_dropped_bytes[buffer] += self._dropped_bytes.pop(key)
+        if not self._topic_used[topic]:
+            del self._topic_used[topic]
+
+    def _count_drop(self, buffer, topic, size):
+        if (buffer, topic) not in self._held:
+            self._buffer_dropped[buffer] += 1
+            self._buffer_dropped_bytes[buffer] += size
+            return
+
+        self._dropped[buffer, topic] += 1
+        self._dropped_bytes[buffer, topic] += size
@@ -1,28 +1,86 @@
 import logging
 import threading
+import time
 
-from rossock.managers.rossock_core import Message
-from rossock.comms.websocket_comms import WebSocketClientFactory as RosBridgeClientFactory
-from rossock import misc
+from collections import OrderedDict
+
+from rossock.managers.rossock_core import Message, Topic
+from rossock.managers.latency_tracer import LatencyTracer
+from rossock.managers.memory_budget import MemoryBudget
+from rossock.managers.send_queue import SendQueue
+from rossock.managers.topic_cache import TopicCache
+from rossock.managers.topic_matcher import TopicMatcher
+from rossock.misc.logger import get_logger
+
+logger = get_logger('connector')
 
 class RosBridgeConnector(object):
-    """Connection manager to RosBridge server."""
+    """Connection manager to RosBridge server.
+    Args:
+        host (:obj:`str` or :obj:`list`): Name or IP address of the ROS bridge host, e.g. ``127.0.0.1``,
+            or a list of hosts and ``ws://`` URLs to fail over between, in order of preference.
+        port (:obj:`int`): ROS bridge port, e.g. ``9090``.
+        is_secure (:obj:`bool`): True to use a secure web sockets connection, otherwise use False.
+        decode_threshold (:obj:`int`): Frames of at least this many bytes are decoded on a worker
+            pool instead of the reactor thread. Defaults to `None`, which decodes every frame inline.
+        decode_workers (:obj:`int`): Number of processes used to decode large frames.
+        memory_budget (:obj:`int`): Maximum number of bytes held in the outbound, decode and dispatch
+            buffers together. Defaults to `None`, unlimited.
+        topic_memory_budget (:obj:`int`): Maximum number of bytes held for a single topic across these
+            buffers. Defaults to `None`, unlimited.
+        ping_interval (:obj:`float`): Seconds between health pings to the bridge. Defaults to `0`, no pings,
+            so a bridge that hangs without closing its connection is not detected. Short intervals and
+            timeouts detect it sooner but drop healthy connections whose pongs are delayed behind large
+            frames or a busy bridge, causing reconnect storms under load.
+        ping_timeout (:obj:`float`): Seconds without a pong after which the connection is dropped
+            and the next endpoint is tried. Pings are timed with a granularity of one second.
+        connect_timeout (:obj:`float`): Seconds to wait for each connection attempt, including the
+            WebSocket handshake. Lower values fail over sooner when an endpoint is unreachable, at
+            the risk of giving up on a bridge that is only slow to answer.
+    """
 
-    def __init__(self, host, port=None, is_secure=False):
+    def __init__(self, host, port=None, is_secure=False, decode_threshold=None, decode_workers=2,
+                 memory_budget=None, topic_memory_budget=None, ping_interval=0, ping_timeout=10.0,
+                 connect_timeout=10.0):
         self._id_counter = 0
-        url = RosBridgeClientFactory.create_url(host, port, is_secure)
-        self.factory = RosBridgeClientFactory(url)
+        self._id_lock = threading.Lock()
+        # The transport and the decode pipeline are loaded on first use to keep imports cheap
+        from rossock.comms.websocket_comms import WebSocketClientFactory as RosBridgeClientFactory
+
+        hosts = host if isinstance(host, (list, tuple)) else [host]
+        endpoints = [RosBridgeClientFactory.create_url(entry, None if '://' in entry else port, is_secure)
+                     for entry in hosts]
+        self.factory = RosBridgeClientFactory(endpoints[0], endpoints=endpoints, ping_interval=ping_interval,
+                                              ping_timeout=ping_timeout, connect_timeout=connect_timeout)
+        self.memory_budget = MemoryBudget(memory_budget, topic_memory_budget)
+        self._send_queue = SendQueue(self.factory, self.memory_budget)
+        if decode_threshold is not None:
+            from rossock.comms.decode_pipeline import DecodePipeline
+
+            self.factory.decode_pipeline = DecodePipeline(decode_threshold, decode_workers,
+                                                          budget=self.memory_budget)
+            self.factory.decode_pipeline.start()
+        self.topic_matcher = TopicMatcher()
+        self._topic_priorities = {}
+        self._topic_budgets = {}
+        self._live_topics = OrderedDict()
+        self._live_topics_lock = threading.Lock()
+        self._connected_once = False
+        self.factory.on('ready', self._restore_topics)
+        self.matched_topics = {}
         self.is_connecting = False
         self.connect()
 
     @property
     def id_counter(self):
         """Generate an auto-incremental ID starting from 1.
+        Safe to use from any thread.
         Returns:
             int: An auto-incremented ID.
         """
-        self._id_counter += 1
-        return self._id_counter
+        with self._id_lock:
+            self._id_counter += 1
+            return self._id_counter
 
     @property
     def is_connected(self):
@@ -34,7 +92,7 @@ class RosBridgeConnector(object):
 
     def connect(self):
         """Connect to ROS master."""
-        misc.formatted_print('RosBridgeConnector\t|\tStarting connection to ros master.')
+        logger.info('Starting connection to ros master')
         # Don't try to reconnect if already connected.
         if self.is_connected or self.is_connecting:
             return
@@ -54,7 +112,7 @@ class RosBridgeConnector(object):
                 proto.send_close()
                 return proto
 
-            self.factory.on_ready(_wrapper_callback)
+            self.factory.manager.call_from_thread(self.factory.on_ready, _wrapper_callback)
 
     def run(self, timeout=None):
         """Kick-starts a non-blocking event loop.
@@ -102,6 +160,319 @@ class RosBridgeConnector(object):
 
         self.factory.manager.terminate()
 
+    def set_topic_priority(self, topic, priority):
+        """Dispatch the messages of a topic through a priority lane.
+        Messages of high priority topics (e.g. ``/tf``) are dispatched ahead of bulk
+        topics (e.g. ``/velodyne_points``) received at the same time. Priority dispatch
+        is enabled the first time this is called.
+        Args:
+            topic (:obj:`str`): Topic name.
+            priority (:obj:`str`): One of ``high``, ``normal`` or ``bulk``, or `None` to reset it.
+        """
+        if priority is None and not self.factory.dispatch_scheduler:
+            return
+
+        if not self.factory.dispatch_scheduler:
+            from rossock.managers.dispatch_scheduler import DispatchScheduler
+            self.factory.dispatch_scheduler = DispatchScheduler(budget=self.memory_budget)
+
+        self.factory.dispatch_scheduler.set_priority(topic, priority)
+
+    def track_topic(self, topic, enable=True):
+        """Keep track of a :class:`.Topic` subscribed or advertised on this connection.
+        Tracked topics are set up again on every new connection after the first one, since a
+        standby bridge or a restarted one has never seen their ``subscribe`` and ``advertise``
+        requests.
+        Args:
+            topic (:class:`.Topic`): The topic.
+            enable (:obj:`bool`): True while the topic has active registrations, False to forget it.
+        """
+        with self._live_topics_lock:
+            if enable:
+                self._live_topics[topic] = True
+            else:
+                self._live_topics.pop(topic, None)
+
+    def _restore_topics(self, proto):
+        if not self._connected_once:
+            self._connected_once = True
+            return
+
+        # Runs ahead of the queued messages, so they are published on restored registrations
+        with self._live_topics_lock:
+            topics = list(self._live_topics)
+
+        for topic in topics:
+            for message in topic.restore_requests():
+                proto.send_ros_message(message)
+
+    def use_topic_priority(self, topic, priority, enable=True):
+        """Request a priority lane for a topic on behalf of one of its subscribers.
+        Calls are counted per topic like :meth:`cache_topic`, so a subscriber giving up its
+        priority does not reset the lane another subscriber of the same topic asked for.
+        While several priorities are requested, the highest one is used.
+        Args:
+            topic (:obj:`str`): Topic name.
+            priority (:obj:`str`): One of ``high``, ``normal`` or ``bulk``.
+            enable (:obj:`bool`): True to request the priority, False to undo a previous request.
+        """
+        requested = self._topic_priorities.setdefault(topic, [])
+        if enable:
+            requested.append(priority)
+        elif priority in requested:
+            requested.remove(priority)
+
+        if not requested:
+            del self._topic_priorities[topic]
+            self.set_topic_priority(topic, None)
+        else:
+            from rossock.managers.dispatch_scheduler import DispatchScheduler
+            self.set_topic_priority(topic, min(requested, key=DispatchScheduler.PRIORITIES.index))
+
+    def call_service(self, message, callback, errback=None):
+        """Send a service request to the ROS Master once the connection is established.
+        Safe to use from any thread, the callbacks are invoked on the event loop thread.
+        Args:
+            message (:class:`.Message`): ROS Bridge ``call_service`` Message.
+            callback: Callback invoked with the :class:`.Message` of the response.
+            errback: Callback invoked with the error values if the service call fails.
+        """
+        def _wrapper_callback(proto):
+            proto.send_ros_service_request(message, callback, errback)
+            return proto
+
+        self.factory.manager.call_from_thread(self.factory.on_ready, _wrapper_callback)
+
+    def get_topics(self, callback, errback=None):
+        """Retrieve the topics known to ROS through ``rosapi``.
+        Args:
+            callback: Callback invoked with the list of topic names and the list of their types.
+                Types are `None` when the bridge does not report them.
+            errback: Callback invoked with the error values if the service call fails.
+        """
+        def _wrapper_callback(response):
+            topics = response.get('topics', [])
+            callback(topics, response.get('types') or [None] * len(topics))
+
+        self.call_service(Message({
+            'op': 'call_service',
+            'id': 'call_service:/rosapi/topics:%d' % self.id_counter,
+            'service': '/rosapi/topics',
+            'type': 'rosapi/Topics',
+            'args': {},
+        }), _wrapper_callback, errback)
+
+    def subscribe_matched_topic(self, name, message_type, options=None):
+        """Subscribe to a topic matched by the :class:`.TopicPattern` subscriptions.
+        The topic is only subscribed once, its messages are handed to every pattern
+        callback matching its name.
+        Args:
+            name (:obj:`str`): Topic name.
+            message_type (:obj:`str`): Message type of the topic.
+            options (:obj:`dict`): Other arguments of the :class:`.Topic`.
+        """
+        if name in self.matched_topics:
+            return
+
+        matcher = self.topic_matcher
+
+        def _dispatch(message):
+            for callback in matcher.match(name):
+                callback(message, name)
+
+        topic = Topic(self, name, message_type, **(options or {}))
+        topic.subscribe(_dispatch)
+        self.matched_topics[name] = topic
+
+    def release_matched_topics(self):
+        """Unsubscribe from the matched topics that no pattern matches any longer."""
+        for name, topic in list(self.matched_topics.items()):
+            if not self.topic_matcher.match(name):
+                topic.unsubscribe()
+                del self.matched_topics[name]
+
+    def enable_latency_tracing(self, sample_every=10, window=1000, clock_interval=10.0):
+        """Trace where inbound messages spend their time.
+        Sampled messages are timed from their ``header.stamp`` through reception, decoding,
+        dispatch queues and callbacks. The offset of the bridge clock is estimated through
+        ``/rosapi/get_time`` every ``clock_interval`` seconds to compare the stamps with
+        local times. Note the bridge reports simulated time when ``use_sim_time`` is set.
+        Args:
+            sample_every (:obj:`int`): Trace one frame out of this many.
+            window (:obj:`int`): Number of traced messages kept per topic.
+            clock_interval (:obj:`float`): Seconds between two clock offset estimations.
+        """
+        if self.factory.latency_tracer:
+            return
+
+        self.factory.latency_tracer = LatencyTracer(sample_every, window)
+        self._clock_interval = clock_interval
+        self._sync_clock(self.factory.latency_tracer)
+
+    def disable_latency_tracing(self):
+        """Stop tracing inbound messages."""
+        self.factory.latency_tracer = None
+
+    def latency_stats(self, topic=None, percentiles=(50, 90, 99)):
+        """Get the latency percentiles of the traced messages.
+        Args:
+            topic (:obj:`str`): Only report this topic. Defaults to `None`, all topics.
+            percentiles (:obj:`tuple`): Percentiles to compute.
+        Returns:
+            dict: ``topics`` with the percentiles (in seconds) of each stage per topic
+            (see :meth:`.LatencyTracer.percentiles`), ``clock_offset`` of the bridge clock
+            and its ``clock_offset_error``, or `None` if tracing is disabled.
+        """
+        tracer = self.factory.latency_tracer
+        if not tracer:
+            return None
+
+        return {
+            'topics': tracer.percentiles(topic, percentiles),
+            'clock_offset': tracer.offset,
+            'clock_offset_error': tracer.offset_error,
+        }
+
+    def _sync_clock(self, tracer):
+        # Stop once tracing is disabled, or enabled again with a new tracer
+        if tracer is not self.factory.latency_tracer:
+            return
+
+        if self.is_connected:
+            message = Message({
+                'op': 'call_service',
+                'id': 'call_service:/rosapi/get_time:%d' % self.id_counter,
+                'service': '/rosapi/get_time',
+                'type': 'rosapi/GetTime',
+                'args': {},
+            })
+
+            def _wrapper_callback(proto):
+                sent = time.time()
+
+                def _received(response):
+                    stamp = response['time']
+                    tracer.clock_sample(sent, stamp['secs'] + stamp['nsecs'] * 1e-9, time.time())
+
+                proto.send_ros_service_request(message, _received, None)
+                return proto
+
+            self.factory.manager.call_from_thread(self.factory.on_ready, _wrapper_callback)
+
+        # Retry soon while disconnected so stamps are corrected early after connecting
+        delay = self._clock_interval if self.is_connected else min(1.0, self._clock_interval)
+        self.call_later(delay, lambda: self._sync_clock(tracer))
+
+    def cache_topic(self, topic, enable=True):
+        """Keep the latest message of a topic for :meth:`latest_message` and :meth:`latest_decoded`.
+        Calls are counted, so a topic stays cached until every caller disabled it. The topic
+        must be subscribed for messages to arrive, see the ``cache`` option of :class:`.Topic`.
+        Args:
+            topic (:obj:`str`): Topic name.
+            enable (:obj:`bool`): True to start caching the topic, False to undo a previous call.
+        """
+        if not self.factory.topic_cache:
+            if not enable:
+                return
+            self.factory.topic_cache = TopicCache()
+
+        if enable:
+            self.factory.topic_cache.track(topic)
+        else:
+            self.factory.topic_cache.untrack(topic)
+
+    def latest_message(self, topic, max_age=None):
+        """Get the latest message received on a cached topic.
+        Safe to use from any thread. The message is shared with other readers and must not be modified.
+        Args:
+            topic (:obj:`str`): Topic name.
+            max_age (:obj:`float`): Seconds after which the message is too old to be returned.
+                Defaults to `None`, no limit.
+        Returns:
+            dict: The message, or `None` if none was received (recently enough).
+        """
+        cache = self.factory.topic_cache
+        latest = cache.latest(topic, max_age) if cache else None
+        return latest[1] if latest else None
+
+    def latest_decoded(self, topic, decoder, max_age=None):
+        """Get an object built by ``decoder`` from the latest message of a cached topic.
+        The object is built once per message and shared by every reader passing the same
+        ``decoder``, so polling a large message (e.g. a point cloud) does not convert it again.
+        Args:
+            topic (:obj:`str`): Topic name.
+            decoder (:obj:`callable`): Function building the object from the message.
+            max_age (:obj:`float`): Seconds after which the message is too old to be returned.
+        Returns:
+            The object built by ``decoder``, or `None` if no message was received (recently enough).
+        """
+        cache = self.factory.topic_cache
+        return cache.decoded(topic, decoder, max_age) if cache else None
+
+    def set_topic_memory_budget(self, topic, max_bytes):
+        """Limit the number of bytes buffered for a single topic.
+        When the budget is exceeded the oldest buffered messages of the topic are
+        shed first, then new messages are dropped.
+        Args:
+            topic (:obj:`str`): Topic name.
+            max_bytes (:obj:`int`): Budget in bytes, `None` to fall back to ``topic_memory_budget``.
+        """
+        self.memory_budget.set_topic_budget(topic, max_bytes)
+
+    def use_topic_memory_budget(self, topic, max_bytes, enable=True):
+        """Request a memory budget for a topic on behalf of one of its subscribers or publishers.
+        Calls are counted per topic like :meth:`use_topic_priority`, the budget is removed once
+        every request is withdrawn. While several budgets are requested, the smallest one is used.
+        Args:
+            topic (:obj:`str`): Topic name.
+            max_bytes (:obj:`int`): Budget in bytes.
+            enable (:obj:`bool`): True to request the budget, False to undo a previous request.
+        """
+        requested = self._topic_budgets.setdefault(topic, [])
+        if enable:
+            requested.append(max_bytes)
+        elif max_bytes in requested:
+            requested.remove(max_bytes)
+
+        if not requested:
+            del self._topic_budgets[topic]
+            self.set_topic_memory_budget(topic, None)
+        else:
+            self.set_topic_memory_budget(topic, min(requested))
+
+    def queued_messages(self, topic):
+        """Get the number of received messages of a topic still waiting to be decoded or dispatched.
+        Args:
+            topic (:obj:`str`): Topic name.
+        Returns:
+            int: Number of messages queued in the decode pipeline and the dispatch lanes.
+        """
+        queued = 0
+        if self.factory.decode_pipeline:
+            queued += self.factory.decode_pipeline.queued(topic)
+        if self.factory.dispatch_scheduler:
+            queued += self.factory.dispatch_scheduler.queued(topic)
+
+        return queued
+
+    def stats(self):
+        """Get the memory held by the client buffers and the connection health.
+        Returns:
+            dict: Bytes held and shed per buffer and per topic (see :meth:`.MemoryBudget.stats`),
+            plus the number of queued outbound messages, pending ``ready`` callbacks and
+            registered events, and the reconnection stats under ``reconnect``
+            (see :meth:`.EndpointFailover.stats`), including the time to the first message
+            after each outage, and the cached topics under ``topic_cache`` (see :meth:`.TopicCache.stats`).
+        """
+        stats = self.memory_budget.stats()
+        stats['outbound_messages'] = len(self._send_queue)
+        stats['ready_callbacks'] = len(self.factory.listeners('ready'))
+        stats['events'] = len(self.factory._events)
+        stats['reconnect'] = self.factory.failover.stats()
+        stats['topic_cache'] = self.factory.topic_cache.stats() if self.factory.topic_cache else {}
+
+        return stats
+
     def on(self, event_name, callback):
         """Add a callback to an arbitrary named event.
         Args:
@@ -145,12 +516,10 @@ class RosBridgeConnector(object):
 
     def send_on_ready(self, message):
         """Send message to the ROS Master once the connection is established.
-        If a connection to ROS is already available, the message is sent immediately.
+        If a connection to ROS is already available, the message is sent on the next
+        reactor iteration. Safe to use from any thread, messages are queued and sent
+        from the reactor thread in the order they were submitted.
         Args:
             message (:class:`.Message`): ROS Bridge Message to send.
         """
-        def _send_internal(proto):
-            proto.send_ros_message(message)
-            return proto
-
-        self.factory.on_ready(_send_internal)
+        self._send_queue.submit(message)
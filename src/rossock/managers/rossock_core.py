@@ -1,6 +1,8 @@
+import functools
 import json
 import logging
 import threading
+import time
 
 # Python 2/3 compatibility import list
 try:
@@ -9,6 +11,8 @@ except ImportError:
     from UserDict import UserDict
 
 
+from rossock.managers.adaptive_throttle import AdaptiveThrottle
+
 """
 Author: Alec Gurman
 Rework: Roslibpy
@@ -34,12 +38,23 @@ class Topic(object):
         queue_size (:obj:`int`): Queue size created at bridge side for re-publishing webtopics.
         latch (:obj:`bool`): True to latch the topic when publishing, False otherwise.
         queue_length (:obj:`int`): Queue length at bridge side used when subscribing.
+        adaptive_throttle (:obj:`bool` or :class:`.AdaptiveThrottle`): True to raise the ``throttle_rate``
+            while the subscriber callback lags behind and relax it again once it recovers. Defaults to `False`.
+        priority (:obj:`str`): Dispatch priority of received messages, one of ``high``, ``normal`` or ``bulk``.
+            Defaults to `None`, which leaves the topic on the default lane.
+        memory_budget (:obj:`int`): Maximum number of bytes buffered for this topic, in either direction,
+            while it is subscribed or advertised. Defaults to `None`, which uses the budget of the connection.
+        local_throttle_rate (:obj:`int`): Minimum time (in ms) between two messages handed to the callback
+            of this subscriber. Unlike ``throttle_rate``, other subscribers of the topic on the same
+            connection keep receiving every message. Defaults to `0`, no limit.
+        cache (:obj:`bool`): True to keep the latest message while subscribed, see :meth:`latest`.
     """
 
     SUPPORTED_COMPRESSION_TYPES = ('png', 'none')
 
     def __init__(self, rosbridge, name, message_type, compression=None, latch=False, throttle_rate=0,
-                 queue_size=100, queue_length=0):
+                 queue_size=100, queue_length=0, adaptive_throttle=False, priority=None,
+                 memory_budget=None, local_throttle_rate=0, cache=False):
         self.rosbridge = rosbridge
         self.name = name
         self.message_type = message_type
@@ -48,9 +63,20 @@ class Topic(object):
         self.throttle_rate = throttle_rate
         self.queue_size = queue_size
         self.queue_length = queue_length
+        self.priority = priority
+        self.memory_budget = memory_budget
+        self.local_throttle_rate = local_throttle_rate
+        self.cache = cache
 
         self._subscribe_id = None
         self._advertise_id = None
+        self._callback = None
+        self._throttle = None
+
+        if adaptive_throttle is True:
+            self._throttle = AdaptiveThrottle(base_rate=throttle_rate)
+        elif adaptive_throttle:
+            self._throttle = adaptive_throttle
 
         if self.compression is None:
             self.compression = 'none'
@@ -75,43 +101,169 @@ class Topic(object):
         """
         return self._subscribe_id is not None
 
-    def subscribe(self, callback):
+    def subscribe(self, callback=None):
         """Register a subscription to the topic.
         Every time a message is published for the given topic,
         the callback will be called with the message object.
         Args:
             callback: Function to be called when messages of this topic are published.
+                Can be omitted for cached topics that are only polled with :meth:`latest`.
         """
         # Avoid duplicate subscription
         if self._subscribe_id:
             return
 
+        if callback is None and not self.cache:
+            raise ValueError('A callback is required to subscribe to a topic that is not cached')
+
         self._subscribe_id = 'subscribe:%s:%d' % (
             self.name, self.rosbridge.id_counter)
 
-        self.rosbridge.on(self.name, callback)
-        self.rosbridge.send_on_ready(Message({
-            'op': 'subscribe',
-            'id': self._subscribe_id,
-            'type': self.message_type,
-            'topic': self.name,
-            'compression': self.compression,
-            'throttle_rate': self.throttle_rate,
-            'queue_length': self.queue_length
-        }))
+        if self._throttle:
+            self._throttle.reset()
+            self.throttle_rate = self._throttle.rate
+
+        listener = None
+        if callback is not None:
+            # Each subscriber registers its own listener, even when several topics share a callback
+            listener = callback
+            if self._throttle:
+                listener = self._adaptive_callback(listener)
+            if self.local_throttle_rate:
+                listener = self._local_throttle_callback(listener)
+            if listener is callback:
+                listener = functools.partial(callback)
+
+        if self.priority:
+            self.rosbridge.use_topic_priority(self.name, self.priority)
+
+        if self.cache:
+            self.rosbridge.cache_topic(self.name)
+
+        if listener is not None:
+            self._callback = listener
+            self.rosbridge.on(self.name, listener)
+        if not self.is_advertised:
+            self._registration_changed(True)
+        self._send_subscribe()
 
     def unsubscribe(self):
         """Unregister from a subscribed the topic."""
         if not self._subscribe_id:
             return
 
-        self.rosbridge.off(self.name)
+        # Only remove this subscriber, others may listen to the same topic
+        if self._callback is not None:
+            self.rosbridge.off(self.name, self._callback)
+            self._callback = None
+        if self.cache:
+            self.rosbridge.cache_topic(self.name, False)
+        if self.priority:
+            self.rosbridge.use_topic_priority(self.name, self.priority, False)
         self.rosbridge.send_on_ready(Message({
             'op': 'unsubscribe',
             'id': self._subscribe_id,
             'topic': self.name
         }))
         self._subscribe_id = None
+        if not self.is_advertised:
+            self._registration_changed(False)
+
+    def _registration_changed(self, registered):
+        # The first registration was added or the last one removed
+        self.rosbridge.track_topic(self, registered)
+        if self.memory_budget is not None:
+            self.rosbridge.use_topic_memory_budget(self.name, self.memory_budget, registered)
+
+    def restore_requests(self):
+        """Get the requests that set up this topic on a bridge, e.g. a standby bridge after failing over.
+        Returns:
+            list: The ``advertise`` and ``subscribe`` :class:`.Message` of the active registrations.
+        """
+        requests = []
+        if self.is_advertised:
+            requests.append(self._advertise_message())
+        if self.is_subscribed:
+            requests.append(self._subscribe_message())
+
+        return requests
+
+    def _send_subscribe(self):
+        # The bridge updates the options of an existing subscription
+        # when it receives a new subscribe request with the same id.
+        self.rosbridge.send_on_ready(self._subscribe_message())
+
+    def _subscribe_message(self):
+        return Message({
+            'op': 'subscribe',
+            'id': self._subscribe_id,
+            'type': self.message_type,
+            'topic': self.name,
+            'compression': self.compression,
+            'throttle_rate': self.throttle_rate,
+            'queue_length': self.queue_length
+        })
+
+    def _advertise_message(self):
+        return Message({
+            'op': 'advertise',
+            'id': self._advertise_id,
+            'type': self.message_type,
+            'topic': self.name,
+            'latch': self.latch,
+            'queue_size': self.queue_size
+        })
+
+    def _adaptive_callback(self, callback):
+        throttle = self._throttle
+
+        def _wrapper(message):
+            throttle.message_received(queued=self.rosbridge.queued_messages(self.name))
+            start = time.time()
+            try:
+                return callback(message)
+            finally:
+                rate = throttle.message_handled(time.time() - start)
+                if rate is not None and self.is_subscribed:
+                    self.throttle_rate = rate
+                    self._send_subscribe()
+
+        return _wrapper
+
+    def _local_throttle_callback(self, callback):
+        interval = self.local_throttle_rate / 1000.0
+        last = [None]
+
+        def _wrapper(message):
+            now = time.time()
+            if last[0] is not None and now - last[0] < interval:
+                return
+            last[0] = now
+            return callback(message)
+
+        return _wrapper
+
+    def latest(self, max_age=None):
+        """Get the latest message received on the topic, for topics created with ``cache=True``.
+        The message is shared with other readers of the topic and must not be modified.
+        Args:
+            max_age (:obj:`float`): Seconds after which the message is too old to be returned.
+                Defaults to `None`, no limit.
+        Returns:
+            dict: The message, or `None` if none was received (recently enough).
+        """
+        return self.rosbridge.latest_message(self.name, max_age)
+
+    def latest_decoded(self, decoder, max_age=None):
+        """Get an object built by ``decoder`` from the latest message, for topics created with ``cache=True``.
+        The object is only built once per message for all readers passing the same ``decoder``.
+        Args:
+            decoder (:obj:`callable`): Function building the object from the message.
+            max_age (:obj:`float`): Seconds after which the message is too old to be returned.
+        Returns:
+            The object built by ``decoder``, or `None` if no message was received (recently enough).
+        """
+        return self.rosbridge.latest_decoded(self.name, decoder, max_age)
 
     def publish(self, message):
         """Publish a message to the topic.
@@ -137,16 +289,9 @@ class Topic(object):
         self._advertise_id = 'advertise:%s:%d' % (
             self.name, self.rosbridge.id_counter)
 
-        self.rosbridge.send_on_ready(Message({
-            'op': 'advertise',
-            'id': self._advertise_id,
-            'type': self.message_type,
-            'topic': self.name,
-            'latch': self.latch,
-            'queue_size': self.queue_size
-        }))
-
-        # TODO: Set _advertise_id=None on disconnect (if not reconnecting)
+        if not self.is_subscribed:
+            self._registration_changed(True)
+        self.rosbridge.send_on_ready(self._advertise_message())
 
     def unadvertise(self):
         """Unregister as a publisher for the topic."""
@@ -160,6 +305,139 @@ class Topic(object):
         }))
 
         self._advertise_id = None
+        if not self.is_subscribed:
+            self._registration_changed(False)
+
+class Service(object):
+    """Call a service in ROS.
+    Args:
+        ros (:class:`.Ros`): Instance of the ROS connection.
+        name (:obj:`str`): Service name, e.g. ``/rosapi/topics``.
+        service_type (:obj:`str`): Service type, e.g. ``rosapi/Topics``.
+    """
+
+    def __init__(self, rosbridge, name, service_type):
+        self.rosbridge = rosbridge
+        self.name = name
+        self.service_type = service_type
+
+    def call(self, request, callback=None, errback=None):
+        """Start a service call.
+        Callbacks are invoked on the event loop thread.
+        Args:
+            request (:class:`.Message`): Service request.
+            callback: Callback invoked with the :class:`.Message` of the response.
+            errback: Callback invoked with the error values if the call fails.
+        """
+        self.rosbridge.call_service(Message({
+            'op': 'call_service',
+            'id': 'call_service:%s:%d' % (self.name, self.rosbridge.id_counter),
+            'service': self.name,
+            'type': self.service_type,
+            'args': dict(request),
+        }), callback, errback)
+
+class TopicPattern(object):
+    """Subscribe to every topic whose name matches a pattern.
+    Patterns match segment by segment (see :class:`.TopicMatcher`), e.g. ``/robot*/scan``
+    or ``/cameras/*/info``, and ``/cameras/**`` for every topic below ``/cameras``.
+    Topics are discovered through ``/rosapi/topics`` as soon as the connection is ready,
+    again after every reconnection, and every ``discovery_interval`` seconds while
+    connected. Each matching topic is subscribed once, no matter
+    how many patterns match it, and its messages are handed to the callbacks of all
+    those patterns. The callback is called with the message and the name of the topic
+    it was received on.
+    Args:
+        ros (:class:`.Ros`): Instance of the ROS connection.
+        pattern (:obj:`str`): Topic name pattern.
+        message_type (:obj:`str`): Message type used when the bridge does not report the type
+            of a topic. Defaults to `None`, which lets the bridge resolve it.
+        discovery_interval (:obj:`float`): Seconds between topic discoveries, `0` to only discover
+            when connecting.
+        options: Other arguments given to the :class:`Topic` of each matching topic,
+            e.g. ``throttle_rate`` or ``priority``.
+    """
+
+    def __init__(self, rosbridge, pattern, message_type=None, discovery_interval=5.0, **options):
+        self.rosbridge = rosbridge
+        self.pattern = pattern
+        self.message_type = message_type
+        self.discovery_interval = discovery_interval
+        self.options = options
+
+        self._callback = None
+        self._discovery = None
+
+    @property
+    def is_subscribed(self):
+        """Indicate if the pattern is subscribed or not.
+        Returns:
+            bool: True if subscribed to this pattern, False otherwise.
+        """
+        return self._callback is not None
+
+    @property
+    def topics(self):
+        """List of the subscribed topics matching the pattern."""
+        return sorted(name for name in self.rosbridge.matched_topics
+                      if self.pattern in self.rosbridge.topic_matcher.patterns(name))
+
+    def subscribe(self, callback):
+        """Register a subscription to every topic matching the pattern.
+        Args:
+            callback: Function called with the message and the topic name every time
+                a message is published on a matching topic.
+        """
+        if self._callback:
+            return
+
+        self._callback = callback
+        self.rosbridge.topic_matcher.add(self.pattern, callback)
+        self.rosbridge.on('ready', self._connected)
+
+        self._discovery = discovery = object()
+        self._discover_periodically(discovery)
+
+    def unsubscribe(self):
+        """Unregister from every topic matching the pattern."""
+        if not self._callback:
+            return
+
+        self.rosbridge.off('ready', self._connected)
+        self.rosbridge.topic_matcher.remove(self.pattern, self._callback)
+        self.rosbridge.release_matched_topics()
+        self._callback = None
+        self._discovery = None
+
+    def discover(self):
+        """Subscribe to the matching topics currently known to the bridge."""
+        if not self.is_subscribed:
+            return
+
+        # Skip discoveries while disconnected, the next one runs once reconnected
+        if self.rosbridge.is_connected:
+            self.rosbridge.get_topics(self._discovered)
+
+    def _connected(self, proto):
+        # A new bridge may know other topics, e.g. after failing over
+        self.rosbridge.get_topics(self._discovered)
+
+    def _discover_periodically(self, discovery):
+        # Stop when unsubscribed, or subscribed again with a new loop
+        if discovery is not self._discovery:
+            return
+
+        self.discover()
+        if self.discovery_interval:
+            self.rosbridge.call_later(self.discovery_interval, lambda: self._discover_periodically(discovery))
+
+    def _discovered(self, topics, types):
+        if not self.is_subscribed:
+            return
+
+        for name, message_type in zip(topics, types):
+            if self.pattern in self.rosbridge.topic_matcher.patterns(name):
+                self.rosbridge.subscribe_matched_topic(name, message_type or self.message_type, self.options)
 
 if __name__ == '__main__':
 
@@ -0,0 +1,138 @@
+import threading
+
+from collections import deque
+
+from rossock.comms.protocol import encode_message
+from rossock.misc.logger import get_logger
+
+logger = get_logger('send')
+
+
+class SendQueue(object):
+    """Thread-safe queue of outbound ROS Bridge messages.
+    Messages can be submitted from any thread. They are serialized on the
+    submitting thread and handed to the reactor in batches: only the first
+    message of a batch schedules a reactor wakeup, every message submitted
+    before that wakeup runs is sent along with it. While the connection is
+    not ready, messages stay queued and are sent once it is established. If
+    sending fails part way through a batch, e.g. while the connection is
+    closing, the unsent messages are queued again ahead of newer ones and
+    sent on the next connection.
+    Published messages are accounted in the ``outbound`` buffer of the memory
+    budget, the oldest ones of a topic are shed first when it is exceeded.
+    Args:
+        factory: Client factory that owns the connection and its event loop manager.
+        budget (:class:`.MemoryBudget`): Memory budget of the client, or `None`.
+    """
+
+    BUFFER = 'outbound'
+
+    def __init__(self, factory, budget=None):
+        self._factory = factory
+        self._budget = budget
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._published = {}
+        self._wakeup_pending = False
+        self._waiting_ready = False
+        self.wakeups = 0
+
+        if budget:
+            budget.register(self.BUFFER, self._evict)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def submit(self, message):
+        """Queue a message to be sent from the reactor thread.
+        Args:
+            message (:class:`.Message`): ROS Bridge Message to send.
+        """
+        payload = encode_message(message)
+        entry = [None, payload]
+
+        # Only publications are accounted and can be shed, never control messages
+        if self._budget and message['op'] == 'publish':
+            entry[0] = message['topic']
+            if not self._budget.reserve(self.BUFFER, entry[0], len(payload)):
+                return
+
+        with self._lock:
+            self._queue.append(entry)
+            if entry[0] is not None:
+                self._published.setdefault(entry[0], deque()).append(entry)
+
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
+
+        self._factory.manager.call_from_thread(self._flush)
+
+    def _evict(self, topic):
+        with self._lock:
+            published = self._published.get(topic)
+            if not published:
+                return 0
+
+            entry = published.popleft()
+            if not published:
+                del self._published[topic]
+
+            # Leave the entry in the queue, it is skipped when sending
+            size = len(entry[1])
+            entry[1] = None
+
+            return size
+
+    def _flush(self):
+        with self._lock:
+            self._wakeup_pending = False
+            self.wakeups += 1
+
+        if not self._waiting_ready:
+            self._waiting_ready = True
+            self._factory.on_ready(self._send_pending)
+
+    def _send_pending(self, proto):
+        self._waiting_ready = False
+
+        with self._lock:
+            batch, self._queue = self._queue, deque()
+
+            for topic, payload in batch:
+                if topic is not None and payload is not None:
+                    published = self._published[topic]
+                    published.popleft()
+                    if not published:
+                        del self._published[topic]
+
+        sent = 0
+        try:
+            for topic, payload in batch:
+                if payload is not None:
+                    proto.send_message(payload)
+                    if topic is not None:
+                        self._budget.release(self.BUFFER, topic, len(payload))
+                sent += 1
+        except Exception as exception:
+            logger.warning('Failed to send, %d messages queued for the next connection: %s',
+                           len(batch) - sent, exception)
+        finally:
+            if sent < len(batch):
+                self._requeue(list(batch)[sent:])
+
+        return proto
+
+    def _requeue(self, entries):
+        entries = [entry for entry in entries if entry[1] is not None]
+
+        with self._lock:
+            self._queue.extendleft(reversed(entries))
+            for entry in reversed(entries):
+                if entry[0] is not None:
+                    self._published.setdefault(entry[0], deque()).appendleft(entry)
+
+            # The current connection is going away, wait for the next one
+            if entries and not self._waiting_ready:
+                self._waiting_ready = True
+                self._factory.once('ready', self._send_pending)
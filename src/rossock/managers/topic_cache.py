@@ -0,0 +1,113 @@
+import threading
+import time
+
+
+class TopicCache(object):
+    """Keep the latest message of tracked topics for readers that poll them.
+    Every message received on a tracked topic replaces the previous one and gets
+    the next sequence number of its topic. Objects built from a message by a
+    decoder (e.g. a point cloud converted to an array) are cached per decoder and
+    keyed by that sequence number, so any number of readers polling the same
+    message only build it once. Messages and decoded objects are shared between
+    readers and must not be modified. Safe to use from any thread.
+    """
+
+    def __init__(self):
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def track(self, topic):
+        """Start keeping the latest message of a topic. Calls are counted, see :meth:`untrack`."""
+        with self._lock:
+            entry = self._topics.get(topic)
+            if entry is None:
+                entry = self._topics[topic] = {'users': 0, 'seq': 0, 'time': None, 'msg': None,
+                                               'decoded': {}, 'decodes': 0, 'hits': 0}
+            entry['users'] += 1
+
+    def untrack(self, topic):
+        """Stop keeping the latest message of a topic once every :meth:`track` call is undone."""
+        with self._lock:
+            entry = self._topics.get(topic)
+            if entry is not None:
+                entry['users'] -= 1
+                if entry['users'] <= 0:
+                    del self._topics[topic]
+
+    def update(self, topic, msg):
+        """Store a message received on a topic. Messages of untracked topics are ignored."""
+        entry = self._topics.get(topic)
+        if entry is None:
+            return
+
+        with self._lock:
+            entry['seq'] += 1
+            entry['time'] = time.time()
+            entry['msg'] = msg
+            entry['decoded'] = {}
+
+    def latest(self, topic, max_age=None):
+        """Get the latest message of a topic.
+        Args:
+            topic (:obj:`str`): Topic name.
+            max_age (:obj:`float`): Seconds after which the message is too old to be returned.
+                Defaults to `None`, no limit.
+        Returns:
+            tuple: ``(seq, msg)`` of the latest message, or `None` if there is none (recent enough).
+        """
+        with self._lock:
+            entry = self._topics.get(topic)
+            if entry is None or entry['msg'] is None:
+                return None
+            if max_age is not None and time.time() - entry['time'] > max_age:
+                return None
+
+            return entry['seq'], entry['msg']
+
+    def decoded(self, topic, decoder, max_age=None):
+        """Get an object built from the latest message of a topic, building it once per message.
+        Args:
+            topic (:obj:`str`): Topic name.
+            decoder (:obj:`callable`): Function building the object from the message. The same
+                function object must be passed to share the cached object.
+            max_age (:obj:`float`): Seconds after which the message is too old to be returned.
+        Returns:
+            The object returned by ``decoder``, or `None` if there is no message (recent enough).
+        """
+        latest = self.latest(topic, max_age)
+        if latest is None:
+            return None
+
+        seq, msg = latest
+        with self._lock:
+            entry = self._topics.get(topic)
+            cached = entry['decoded'].get(decoder) if entry else None
+            if cached is not None and cached[0] == seq:
+                entry['hits'] += 1
+                return cached[1]
+
+        # Decode without holding the lock, a concurrent reader may decode the same message
+        value = decoder(msg)
+
+        with self._lock:
+            entry = self._topics.get(topic)
+            if entry is not None and entry['seq'] == seq:
+                entry['decoded'][decoder] = (seq, value)
+                entry['decodes'] += 1
+
+        return value
+
+    def stats(self):
+        """Get the state of the tracked topics.
+        Returns:
+            dict: Per topic, the ``seq`` of its latest message, its ``age`` in seconds (`None` before
+            the first one), and the number of ``decodes`` and decoded cache ``hits``.
+        """
+        now = time.time()
+        with self._lock:
+            return dict((topic, {
+                'seq': entry['seq'],
+                'age': now - entry['time'] if entry['time'] is not None else None,
+                'decodes': entry['decodes'],
+                'hits': entry['hits'],
+            }) for topic, entry in self._topics.items())
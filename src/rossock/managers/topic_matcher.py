@@ -0,0 +1,150 @@
+import fnmatch
+import re
+import threading
+
+_GLOB_CHARS = re.compile(r'[*?\[]')
+
+
+class _Node(object):
+    __slots__ = ('children', 'globs', 'deep', 'handlers')
+
+    def __init__(self):
+        self.children = {}
+        self.globs = []
+        self.deep = None
+        self.handlers = []
+
+
+def _segments(name):
+    return name.strip('/').split('/')
+
+
+class TopicMatcher(object):
+    """Index of topic name patterns, resolved once per topic name.
+    Patterns are matched segment by segment. A segment can be a literal name,
+    a shell-style glob that stays within the segment (``robot*``, ``cam?``,
+    ``[ab]``) or ``**``, which matches any number of segments, e.g. ``/cameras/**``
+    subscribes to every topic below ``/cameras``. Patterns are stored in a trie of
+    segments: literal segments are a dictionary lookup, only glob segments are
+    tested with their precompiled expression.
+    The handlers matching a topic name are resolved the first time the name is
+    seen and cached until patterns are added or removed, so matching a known
+    topic is a single dictionary lookup. Safe to use from any thread.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._cache = {}
+        self._order = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_pattern(name):
+        """Indicate if a topic name contains wildcards."""
+        return bool(_GLOB_CHARS.search(name))
+
+    def add(self, pattern, handler):
+        """Register a handler for every topic matching ``pattern``."""
+        with self._lock:
+            node = self._root
+            for segment in _segments(pattern):
+                if segment == '**':
+                    if node.deep is None:
+                        node.deep = _Node()
+                    node = node.deep
+                elif _GLOB_CHARS.search(segment):
+                    for regex, child in node.globs:
+                        if regex.pattern == fnmatch.translate(segment):
+                            node = child
+                            break
+                    else:
+                        child = _Node()
+                        node.globs.append((re.compile(fnmatch.translate(segment)), child))
+                        node = child
+                else:
+                    node = node.children.setdefault(segment, _Node())
+
+            self._order += 1
+            node.handlers.append((self._order, pattern, handler))
+            self._cache = {}
+
+    def remove(self, pattern, handler):
+        """Unregister a handler added for ``pattern``."""
+        with self._lock:
+            node = self._find(pattern)
+            if node is not None:
+                node.handlers = [entry for entry in node.handlers if entry[1] != pattern or entry[2] != handler]
+            self._cache = {}
+
+    def match(self, topic):
+        """Get the handlers matching a topic name, in the order they were added.
+        Returns:
+            tuple: Handlers, empty if no pattern matches.
+        """
+        entry = self._cache.get(topic)
+        if entry is None:
+            entry = self._resolve(topic)
+        return entry[1]
+
+    def patterns(self, topic):
+        """Get the patterns matching a topic name.
+        Returns:
+            tuple: Patterns, empty if none matches.
+        """
+        entry = self._cache.get(topic)
+        if entry is None:
+            entry = self._resolve(topic)
+        return entry[0]
+
+    def _resolve(self, topic):
+        with self._lock:
+            matched = []
+            self._walk(self._root, _segments(topic), 0, matched)
+
+            seen = set()
+            patterns, handlers = [], []
+            for order, pattern, handler in sorted(matched, key=lambda entry: entry[0]):
+                if order in seen:
+                    continue
+                seen.add(order)
+                if pattern not in patterns:
+                    patterns.append(pattern)
+                handlers.append(handler)
+
+            entry = self._cache[topic] = (tuple(patterns), tuple(handlers))
+            return entry
+
+    def _walk(self, node, segments, index, matched):
+        # ``**`` also matches no segment at all
+        if node.deep is not None:
+            for start in range(index, len(segments) + 1):
+                self._walk(node.deep, segments, start, matched)
+
+        if index == len(segments):
+            matched.extend(node.handlers)
+            return
+
+        segment = segments[index]
+        child = node.children.get(segment)
+        if child is not None:
+            self._walk(child, segments, index + 1, matched)
+
+        for regex, child in node.globs:
+            if regex.match(segment):
+                self._walk(child, segments, index + 1, matched)
+
+    def _find(self, pattern):
+        node = self._root
+        for segment in _segments(pattern):
+            if segment == '**':
+                node = node.deep
+            elif _GLOB_CHARS.search(segment):
+                translated = fnmatch.translate(segment)
+                node = next((child for regex, child in node.globs if regex.pattern == translated), None)
+            else:
+                node = node.children.get(segment)
+
+            if node is None:
+                return None
+
+        return node
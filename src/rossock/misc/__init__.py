@@ -1,9 +1,7 @@
 
 import os
 import sys
-import time
-import numpy
-import cPickle
+import logging
 import traceback
 
 if os.name == "posix":
@@ -34,26 +32,22 @@ else:
 		"ENDC": ''
 	}
 
-def formatted_print(msg, color=None, status=None):
-	final_str = msg
-
-	if color is None and status is not None:
-		if status.lower() == "success":
-			color = "GREEN"
-		elif status.lower() == "error":
-			color = "RED"
-		elif status.lower() == "warning":
-			color = "ORANGE"
-		elif status.lower() == "connecting":
-			color = "MAGENTA"
+STATUS_LEVELS = {
+	"success": logging.INFO,
+	"connecting": logging.INFO,
+	"warning": logging.WARNING,
+	"error": logging.ERROR
+}
 
-	if color is not None:
-		final_str = colors[color.upper()] + msg + colors["ENDC"]
+def formatted_print(msg, color=None, status=None):
+	# Kept for applications, rossock itself logs through misc.logger
+	from rossock.misc.logger import get_logger
 
-	print final_str
+	level = STATUS_LEVELS.get((status or "").lower(), logging.INFO)
+	get_logger("app", burst=None).log(level, "%s", msg)
 
 def print_safe_except_report(msg="", *args):
-	print RED + msg + ENDC
+	print colors["RED"] + msg + colors["ENDC"]
 	print "--------------------- Safe Error Report ----------------------"
 	exc_type, exc_value, exc_traceback = sys.exc_info()
 	traceback.print_exception(exc_type, exc_value, exc_traceback)
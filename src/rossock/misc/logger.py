@@ -0,0 +1,234 @@
+import logging
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from rossock import misc
+
+ROOT = 'rossock'
+
+LEVEL_COLORS = {
+    logging.DEBUG: 'DARKCYAN',
+    logging.INFO: 'GREEN',
+    logging.WARNING: 'ORANGE',
+    logging.ERROR: 'RED',
+    logging.CRITICAL: 'RED',
+}
+
+_configured = False
+_config_lock = threading.Lock()
+
+
+class ColorFormatter(logging.Formatter):
+    """Format records with the colors of their level, as ``formatted_print`` used to."""
+
+    def format(self, record):
+        text = logging.Formatter.format(self, record)
+        color = misc.colors.get(LEVEL_COLORS.get(record.levelno, ''), '')
+        return color + text + misc.colors['ENDC'] if color else text
+
+
+class QueueHandler(logging.Handler):
+    """Hand records to a background thread so logging never blocks the caller.
+    The message of a record is formatted on the calling thread, capturing its
+    arguments as they are when logging, while writing it, which may block on a
+    slow stream, happens on the background thread. When the queue is full,
+    records are dropped and counted in ``dropped`` instead of waiting.
+    Args:
+        handlers (:obj:`list`): Handlers that write the records.
+        max_size (:obj:`int`): Maximum number of records waiting to be written.
+    """
+
+    def __init__(self, handlers, max_size=10000):
+        logging.Handler.__init__(self)
+        self.handlers = list(handlers)
+        self.dropped = 0
+        self._queue = queue.Queue(max_size)
+
+        self._thread = threading.Thread(target=self._run, name='rossock-log')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+        # Freeze the arguments and the traceback, they might change before being written
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+
+class _DefaultHandler(logging.StreamHandler):
+    """Console handler used until the application configures logging.
+    Records also propagate to the root logger, so once the application installs
+    its own handlers (e.g. ``rospy.init_node``) this one stops writing instead
+    of duplicating them.
+    """
+
+    def emit(self, record):
+        if not logging.getLogger().handlers:
+            logging.StreamHandler.emit(self, record)
+
+
+class RateLimitedLogger(object):
+    """Leveled logger that limits how often each call site can log.
+    Every call site may log ``burst`` records per ``interval`` seconds, further records
+    are suppressed and counted, and the count is reported with the next record that
+    gets through. Messages are %-formatted lazily, only when they are written, and
+    calls below the enabled level return right away.
+    Args:
+        logger (:class:`logging.Logger`): Logger records are sent to.
+        burst (:obj:`int`): Records allowed per call site and interval, `None` for no limit.
+        interval (:obj:`float`): Seconds of the rate limiting window.
+    """
+
+    def __init__(self, logger, burst=10, interval=10.0):
+        self.logger = logger
+        self.burst = burst
+        self.interval = interval
+        self._sites = {}
+
+    def debug(self, msg, *args, **kwargs):
+        self._log(logging.DEBUG, msg, args, kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self._log(logging.INFO, msg, args, kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self._log(logging.WARNING, msg, args, kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self._log(logging.ERROR, msg, args, kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        kwargs.setdefault('exc_info', True)
+        self._log(logging.ERROR, msg, args, kwargs)
+
+    def log(self, level, msg, *args, **kwargs):
+        self._log(level, msg, args, kwargs)
+
+    def is_enabled_for(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level, msg, args, kwargs):
+        if not _configured:
+            _default_config()
+        if not self.logger.isEnabledFor(level):
+            return
+        if self.burst is None:
+            self.logger.log(level, msg, *args, **kwargs)
+            return
+
+        # Identify the call site by the code and line calling the level method
+        frame = sys._getframe(2)
+        site = (frame.f_code, frame.f_lineno)
+
+        now = time.time()
+        window = self._sites.get(site)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            window = self._sites[site] = [now, 0, 0]
+        else:
+            suppressed = 0
+
+        window[1] += 1
+        if window[1] > self.burst:
+            window[2] += 1
+            return
+
+        if suppressed:
+            # The count is formatted lazily along with the other arguments
+            if not args:
+                msg = msg.replace('%', '%%')
+            msg += ' (%d similar messages suppressed)'
+            args += (suppressed,)
+
+        self.logger.log(level, msg, *args, **kwargs)
+
+
+def get_logger(name, burst=10, interval=10.0):
+    """Get the rate limited logger of a rossock component.
+    Until the application configures logging, either through :func:`configure_logging`
+    or by adding handlers to the root logger, records are written to the console,
+    keeping the output rossock used to print.
+    Args:
+        name (:obj:`str`): Component name, the logger is ``rossock.<name>``.
+        burst (:obj:`int`): Records allowed per call site and interval.
+        interval (:obj:`float`): Seconds of the rate limiting window.
+    Returns:
+        :class:`RateLimitedLogger`: The logger.
+    """
+    return RateLimitedLogger(logging.getLogger(ROOT + '.' + name), burst, interval)
+
+
+def configure_logging(level=logging.INFO, stream=None, colored=None, use_queue=False, fmt=None):
+    """Configure where and how rossock logs, replacing the default console handler.
+    Records of rossock are then only written by this handler, not by the root logger.
+    Args:
+        level (:obj:`int`): Minimum level written, e.g. ``logging.DEBUG``.
+        stream: Stream written to. Defaults to ``sys.stdout``.
+        colored (:obj:`bool`): True to color records by level. Defaults to coloring terminals.
+        use_queue (:obj:`bool`): True to write records from a background thread, so that
+            logging never blocks the event loop.
+        fmt (:obj:`str`): Format of the records, see :mod:`logging`.
+    Returns:
+        :class:`logging.Handler`: The handler installed on the ``rossock`` logger.
+    """
+    handler = _console_handler(logging.StreamHandler, stream, colored, fmt)
+    if use_queue:
+        handler = QueueHandler([handler])
+
+    _install(handler, level, propagate=False)
+    return handler
+
+
+def _console_handler(handler_class, stream=None, colored=None, fmt=None):
+    stream = stream or sys.stdout
+    if colored is None:
+        colored = hasattr(stream, 'isatty') and stream.isatty()
+
+    handler = handler_class(stream)
+    formatter_class = ColorFormatter if colored else logging.Formatter
+    handler.setFormatter(formatter_class(fmt or '%(name)s\t|\t%(message)s'))
+    return handler
+
+
+def _install(handler, level, propagate):
+    global _configured
+
+    logger = logging.getLogger(ROOT)
+    with _config_lock:
+        for existing in list(logger.handlers):
+            logger.removeHandler(existing)
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = propagate
+        _configured = True
+
+
+def _default_config():
+    global _configured
+
+    # Leave it to the application when it configured logging itself
+    if logging.getLogger().handlers or logging.getLogger(ROOT).handlers:
+        _configured = True
+        return
+
+    _install(_console_handler(_DefaultHandler), logging.INFO, propagate=True)